@@ -28,19 +28,86 @@ import json
 import gzip
 import hashlib
 import time
+import argparse
+import threading
+import collections
+import concurrent.futures
 import fbx
+import fbxbin
 import rbmesh
 import logger
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import assetcache
+import httpclient
+import fetchpolicy
+import jobqueue
+import meshworker
+import metrics
+import profiling
+import manifest
+import fileutil
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import email.utils as email_utils
-import urllib.request
 import urllib.error
+import urllib.parse
+
+
+# persistent asset cache (assetcache.AssetCache), configured in main()
+asset_cache = None
+# cached assets validated less than this number of seconds ago are used without any request
+cache_fresh_seconds = 6 * 60 * 60
+# max number of assets fetched in parallel
+fetch_workers = 8
+# keep-alive connections shared by all fetch threads
+http_pool = httpclient.ConnectionPool()
+# negative cache, retries and rate limit for asset requests, configured in main()
+fetch_policy = fetchpolicy.FetchPolicy()
+# asset ids are resolved to this URL (can be pointed to a local server for testing)
+asset_fetch_endpoint = 'https://assetdelivery.roblox.com/v1/asset/?id='
+# default output format: 'ascii' (FBX 7.3) or 'binary' (FBX 7.4), can be overridden per export
+fbx_format = 'ascii'
+# significant digits of ASCII FBX geometry arrays, None - shortest exact representation
+fbx_float_precision = None
+# models are exported to <output_folder><model name>/
+output_folder = "./Avatars/"
+
+# stored in export manifests, bump it whenever the exported files change for the same model description
+EXPORTER_VERSION = '1.1'
+
+FBX_FORMATS = ('ascii', 'binary')
+# FBX documents are streamed to disk through a buffer of this size
+FBX_WRITE_BUFFER_SIZE = 1024 * 1024
+# status of batch exports that succeeded without some of their assets
+BATCH_PARTIAL = 'partial'
+
+# process-wide cache of built-in assets: raw blobs, parsed meshes and pre-transformed geometries
+# filled by warm_built_in_assets() at startup (or on first use), so exports never touch the disk for them
+BUILT_IN_FOLDERS = ('./built-in/', './built-in/avatar/heads/')
+built_in_blobs = dict()
+built_in_meshes = dict()
+built_in_geos = dict()
+built_in_lock = threading.Lock()
+# parsed meshes shared by all exports, keyed by payload hash, configured in main()
+mesh_cache = rbmesh.MeshCache(256 * 1024 * 1024)
+# bounded pool of export jobs (jobqueue.JobQueue), configured in main()
+export_jobs = None
+# process pool for MeshPart parse/transform/geometry work (meshworker.create_pool), None - done in the export thread
+mesh_workers = None
+# worker pid -> (parsed meshes, size in bytes) of its mesh cache, as reported with the last geometry
+mesh_worker_caches = dict()
+# hashes of the mesh payloads sent to the mesh workers, see submit_mesh_parts()
+mesh_worker_hashes = set()
+# profile every export (profiling.MODES), None - only exports requested with '?profile=', configured in main()
+profile_mode = None
+# number of functions / allocation sites in the profile reports
+profile_top = 30
+# re-export models even if their manifest is up to date, configured in main()
+force_export = False
 
 
 def ensure_path_exist(file_path: str) -> str:
     dir_name = os.path.dirname(file_path)
-    if not os.path.isdir(dir_name):
-        os.makedirs(dir_name)
+    # exist_ok: the folder can be created by a concurrent export
+    os.makedirs(dir_name, exist_ok=True)
     return dir_name
 
 
@@ -96,6 +163,13 @@ def detect_asset_type(content: bytes) -> str:
         if header == mesh_v41_header:
             return 'mesh'
 
+    # binary mesh with FACS / chunked mesh
+    if len(content) > 12:
+        data_stream = io.BytesIO(content)
+        header = data_stream.read(12)
+        if header == b'version 5.00' or header == b'version 6.00' or header == b'version 7.00':
+            return 'mesh'
+
     if len(content) > 8:
         data_stream = io.BytesIO(content)
         header = data_stream.read(8)
@@ -120,32 +194,33 @@ def detect_asset_type(content: bytes) -> str:
 
 
 def fetch_local_asset(file_path: str):
+    key = os.path.normpath(file_path)
+    blob = built_in_blobs.get(key, None)
+    if blob is None:
+        with open(file_path, 'rb') as bin_file:
+            data = bin_file.read()
+            bin_file.close()
 
-    with open(file_path, 'rb') as bin_file:
-        data = bin_file.read()
-        bin_file.close()
-
-    h256 = hashlib.sha256()
-    h256.update(data)
+        h256 = hashlib.sha256()
+        h256.update(data)
 
-    return {"hash": h256.hexdigest(),
-            "cdn_url": file_path,
-            "ts": int(0),
-            "code": 200,
-            "fetched_bytes": len(data),
-            "payload_bytes": len(data),
-            "payload": data}, None
+        blob = {"hash": h256.hexdigest(),
+                "cdn_url": file_path,
+                "ts": int(0),
+                "code": 200,
+                "fetched_bytes": len(data),
+                "payload_bytes": len(data),
+                "payload": data}
 
+        with built_in_lock:
+            built_in_blobs[key] = blob
 
-def fetch_asset(url: str) -> dict or None:
-    if not url:
-        return None, "Invalid URL"
+    # payload is immutable bytes, the dict itself is copied
+    return dict(blob), None
 
-    if url.startswith('rbxasset://'):
-        url = "./built-in/" + url[11:]
-        return fetch_local_asset(url)
 
-    asset_fetch_endpoint = 'https://assetdelivery.roblox.com/v1/asset/?id='
+def get_asset_fetch_url(url: str) -> str:
+    # asset URL as requested from the asset endpoint (and stored in the asset cache)
     if url.startswith('rbxassetid://'):
         url = asset_fetch_endpoint + url[13:]
     elif url.startswith('https://www.roblox.com/asset/?id='):
@@ -155,39 +230,80 @@ def fetch_asset(url: str) -> dict or None:
     elif url.startswith('http://www.roblox.com/asset/?id='):
         url = asset_fetch_endpoint + url[32:]
 
+    return url.replace(" ", "")
+
+
+def fetch_asset(url: str) -> dict or None:
+    if not url:
+        return None, "Invalid URL"
+
+    if url.startswith('rbxasset://'):
+        url = "./built-in/" + url[11:]
+        return fetch_local_asset(url)
+
+    url = get_asset_fetch_url(url)
+    headers = {'Roblox-Place-Id': '0',
+               'Accept-Encoding': 'gzip',
+               'User-Agent': 'RobloxStudio/WinInet'}
+
+    cache_record = None
+    if asset_cache is not None:
+        cache_record = asset_cache.get_record(url)
+        if cache_record is not None:
+            if asset_cache.is_fresh(cache_record, cache_fresh_seconds):
+                blob = asset_cache.get(url)
+                if blob is not None:
+                    return blob, None
+            # revalidate cached asset, unchanged asset is confirmed with '304 Not Modified' (no payload)
+            if cache_record.get('etag', None):
+                headers['If-None-Match'] = cache_record['etag']
+            if cache_record.get('last_modified', None):
+                headers['If-Modified-Since'] = cache_record['last_modified']
+
     try:
-        url = url.replace(" ", "")
-        request = urllib.request.Request(url)
-        request.add_header('Roblox-Place-Id', '0')
-        request.add_header('Accept-Encoding', 'gzip')
-        request.add_header('User-Agent', 'RobloxStudio/WinInet')
-
-        # noinspection PyUnusedLocal
-        fetched_bytes = 0
-        response = urllib.request.urlopen(request)
-        if response.info().get('Content-Encoding') == 'gzip':
-            compressed_data = response.read()
-            fetched_bytes = len(compressed_data)
-            data = gzip.decompress(compressed_data)
+        response = fetch_policy.call(url, lambda: http_pool.get(url, headers))
+        if response.status == 304:
+            blob = None
+            if cache_record is not None:
+                blob = asset_cache.get(url)
+            if blob is not None:
+                asset_cache.revalidated(url, cache_record)
+                return blob, None
+            # cached payload is gone, fetch it again
+            headers.pop('If-None-Match', None)
+            headers.pop('If-Modified-Since', None)
+            response = fetch_policy.call(url, lambda: http_pool.get(url, headers))
+
+        fetched_bytes = len(response.body)
+        if response.headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(response.body)
         else:
-            data = response.read()
-            fetched_bytes = len(data)
+            data = response.body
 
-        cdn_url = str(response.geturl())
+        cdn_url = response.url
 
         h256 = hashlib.sha256()
         h256.update(data)
 
-        html_timestamp = response.info().get('Last-Modified')
-        timestamp = int(time.mktime(email_utils.parsedate(html_timestamp)))
+        timestamp = 0
+        html_timestamp = response.headers.get('Last-Modified')
+        if html_timestamp:
+            timestamp = int(time.mktime(email_utils.parsedate(html_timestamp)))
 
-        return {"hash": h256.hexdigest(),
+        blob = {"hash": h256.hexdigest(),
                 "cdn_url": cdn_url,
                 "ts": timestamp,
-                "code": response.getcode(),
+                "code": response.status,
                 "fetched_bytes": fetched_bytes,
                 "payload_bytes": len(data),
-                "payload": data}, None
+                "payload": data,
+                "etag": response.headers.get('ETag'),
+                "last_modified": html_timestamp}
+
+        if asset_cache is not None:
+            asset_cache.put(url, blob)
+
+        return blob, None
 
     except urllib.error.HTTPError as ex:
         logger.warn("Can't fetch asset '" + url + "'")
@@ -204,6 +320,31 @@ def fetch_asset(url: str) -> dict or None:
         return None, str(ex)
 
 
+def fetch_assets(urls: list) -> dict:
+    # fetch unique asset URLs in parallel, returns url -> blob (None if fetch failed)
+    unique_urls = [url for url in dict.fromkeys(urls) if url]
+    blobs = dict()
+    if len(unique_urls) == 0:
+        return blobs
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(fetch_workers, len(unique_urls))) as executor:
+        for url, (blob, err) in zip(unique_urls, executor.map(fetch_asset, unique_urls)):
+            if blob is None:
+                logger.message("    Failed: " + url)
+                metrics.count('fetch_failures')
+            elif blob.get("cached", False):
+                logger.debug("    Cached: %s", url)
+                metrics.count('asset_cache_hits')
+            else:
+                logger.debug("    Fetched: %s", url)
+                if not url.startswith('rbxasset://'):
+                    metrics.count('asset_cache_misses')
+                    metrics.count('fetched_bytes', blob["fetched_bytes"])
+            blobs[url] = blob
+
+    return blobs
+
+
 def resolve_id_to_reference(object_id: int, id_to_object: dict):
     if object_id == -1:
         return None
@@ -219,6 +360,12 @@ class SceneDescription:
         self.geos_layer_id = 0
         self.accs_layer_id = 0
         self.attachments_material_id = 0
+        # MeshPart -> future of the geometry built by mesh_workers
+        self.mesh_part_geos = dict()
+        # texture files written to textures_folder
+        self.texture_files = list()
+        # mesh URLs that were fetched but could not be loaded (unsupported or broken meshes)
+        self.failed_meshes = list()
 
 
 class Connection:
@@ -348,20 +495,6 @@ def cframe_multiply(a: CFrame, b: CFrame) -> CFrame:
     return res
 
 
-def cframe_transform_pos(cframe: CFrame, x: float, y: float, z: float):
-    rx = cframe.r00 * x + cframe.r01 * y + cframe.r02 * z + cframe.tx
-    ry = cframe.r10 * x + cframe.r11 * y + cframe.r12 * z + cframe.ty
-    rz = cframe.r20 * x + cframe.r21 * y + cframe.r22 * z + cframe.tz
-    return rx, ry, rz
-
-
-def cframe_transform_vec(cframe: CFrame, x: float, y: float, z: float):
-    rx = cframe.r00 * x + cframe.r01 * y + cframe.r02 * z
-    ry = cframe.r10 * x + cframe.r11 * y + cframe.r12 * z
-    rz = cframe.r20 * x + cframe.r21 * y + cframe.r22 * z
-    return rx, ry, rz
-
-
 class Instance:
     def __init__(self):
         self.name = ""
@@ -578,25 +711,20 @@ def parse_model_desc(model_desc) -> Instance or None:
         else:
             obj.parent.children.append(obj)
 
-    # 3rd pass - fetch actual data from CDN
-    data_cache = dict()
+    # 3rd pass - fetch actual data from CDN (all unique assets at once)
+    asset_urls = list()
     for obj in objects:
         if isinstance(obj, MeshPart):
-            obj.mesh_blob = data_cache.get(obj.mesh_id, None)
-            if obj.mesh_blob is None:
-                logger.message("Fetch mesh: " + obj.mesh_id)
-                obj.mesh_blob, err = fetch_asset(obj.mesh_id)
-                data_cache[obj.mesh_id] = obj.mesh_blob
-            else:
-                logger.message("    Cached mesh: " + obj.mesh_id)
+            asset_urls.append(obj.mesh_id)
+            asset_urls.append(obj.texture_id)
 
+    logger.message("Fetch assets...")
+    with metrics.stage('fetch'):
+        data_cache = fetch_assets(asset_urls)
+    for obj in objects:
+        if isinstance(obj, MeshPart):
+            obj.mesh_blob = data_cache.get(obj.mesh_id, None)
             obj.texture_blob = data_cache.get(obj.texture_id, None)
-            if obj.texture_blob is None:
-                logger.message("    Fetch texture: " + obj.texture_id)
-                obj.texture_blob, err = fetch_asset(obj.texture_id)
-                data_cache[obj.texture_id] = obj.texture_blob
-            else:
-                logger.message("    Cached texture: " + obj.texture_id)
 
     return root
 
@@ -642,20 +770,55 @@ def get_fbx_transform(cframe: CFrame) -> fbx.FbxTransform:
 
 
 def load_mesh(file_name: str) -> rbmesh.Mesh or None:
-    mesh_handle = open(file_name, 'rb')
-    mesh_payload = mesh_handle.read()
-    mesh_handle.close()
-    mesh = rbmesh.parse_mesh(mesh_payload)
-    return mesh
+    # built-in meshes are parsed once, every caller gets its own copy (mesh_transform_vertices works in place)
+    key = os.path.normpath(file_name)
+    mesh = built_in_meshes.get(key, None)
+    if mesh is None:
+        blob, _ = fetch_local_asset(file_name)
+        mesh = rbmesh.parse_mesh(blob["payload"], lazy=True)
+        if mesh is None:
+            return None
+        with built_in_lock:
+            built_in_meshes[key] = mesh
+    return mesh.copy()
 
 
 def load_mesh_as_fbx_geo(file_name: str, cframe: CFrame):
-    mesh = load_mesh(file_name)
-    mesh_transform_vertices(mesh, cframe)
-    geo = rbmesh.convert_mesh_to_fbx_geometry(mesh, 0)
+    # returned geometry is shared by all exports and must not be modified
+    key = (os.path.normpath(file_name), cframe.tx, cframe.ty, cframe.tz,
+           cframe.r00, cframe.r01, cframe.r02, cframe.r10, cframe.r11, cframe.r12, cframe.r20, cframe.r21, cframe.r22)
+    geo = built_in_geos.get(key, None)
+    if geo is None:
+        mesh = load_mesh(file_name)
+        mesh_transform_vertices(mesh, cframe)
+        geo = rbmesh.convert_mesh_to_fbx_geometry(mesh, 0)
+        with built_in_lock:
+            built_in_geos[key] = geo
     return geo
 
 
+def get_attachment_geos():
+    # attachment sphere and grip spike
+    rot_y_180 = cframe_rotation_y(3.14159)
+    spike_pivot = cframe_translation(0, 0.5, 0)
+    sphere_geo = load_mesh_as_fbx_geo("./built-in/sphere.mesh", rot_y_180)
+    spike_geo = load_mesh_as_fbx_geo("./built-in/spike.mesh", cframe_multiply(rot_y_180, spike_pivot))
+    return sphere_geo, spike_geo
+
+
+def warm_built_in_assets():
+    for folder in BUILT_IN_FOLDERS:
+        for file_name in sorted(os.listdir(folder)):
+            file_path = folder + file_name
+            if not os.path.isfile(file_path):
+                continue
+            fetch_local_asset(file_path)
+            if file_name.endswith('.mesh'):
+                load_mesh(file_path)
+    get_attachment_geos()
+    logger.message('Built-in assets: {0} files, {1} meshes'.format(len(built_in_blobs), len(built_in_meshes)))
+
+
 def get_texture_name(url: str):
     texture_name = "url_resolve_error"
 
@@ -684,36 +847,100 @@ def get_texture_name(url: str):
     return texture_name
 
 
+def get_mesh_part_transform(node) -> tuple:
+    return get_mesh_transform(cframe_rotation_y(3.14159),
+                              node.offset_x, node.offset_y, node.offset_z,
+                              node.scale_x, node.scale_y, node.scale_z)
+
+
+def submit_mesh_part(node, send_payload: bool) -> concurrent.futures.Future:
+    payload = node.mesh_blob["payload"] if send_payload else None
+    return mesh_workers.submit(meshworker.build_geometry, node.mesh_blob["hash"], payload,
+                               *get_mesh_part_transform(node), metrics.enabled)
+
+
+def submit_mesh_parts(nodes: list, desc: SceneDescription):
+    # start building geometry of all downloaded meshes in worker processes,
+    # append_to_fbx() picks the results up in the scene order
+    if mesh_workers is None:
+        return
+    for node in nodes:
+        if isinstance(node, MeshPart) and node.mesh_blob is not None:
+            # every payload is sent once, later only its hash (workers are likely to have the mesh cached)
+            payload_hash = node.mesh_blob["hash"]
+            send_payload = payload_hash not in mesh_worker_hashes
+            mesh_worker_hashes.add(payload_hash)
+            desc.mesh_part_geos[node] = submit_mesh_part(node, send_payload)
+
+
+def wait_mesh_part_geometry(future: concurrent.futures.Future) -> tuple or str or None:
+    with metrics.stage('mesh_wait'):
+        buffers, worker_metrics, (worker_pid, cache_entries, cache_size) = future.result()
+    # parse/transform/convert stages and mesh cache counters recorded by the worker
+    metrics.merge(worker_metrics)
+    mesh_worker_caches[worker_pid] = (cache_entries, cache_size)
+    return buffers
+
+
+def load_mesh_part_mesh(node) -> rbmesh.Mesh or None:
+    mesh = None
+    if node.mesh_blob is None:
+        if node.mesh_type == "Head":
+            mesh = load_mesh("./built-in/sm_head.mesh")
+            scale_xz = min(node.scale_x, node.scale_z)
+            node.scale_x = scale_xz
+            node.scale_z = scale_xz
+            node.scale_x = node.scale_x / 1.25
+            node.scale_y = node.scale_y / 1.25
+            node.scale_z = node.scale_z / 1.25
+        elif node.mesh_type == "Sphere":
+            mesh = load_mesh("./built-in/sm_sphere.mesh")
+            node.scale_x = node.scale_x / 1.45
+            node.scale_y = node.scale_y / 1.45
+            node.scale_z = node.scale_z / 1.45
+    else:
+        mesh_payload = node.mesh_blob["payload"]
+        mesh = mesh_cache.parse(node.mesh_blob["hash"], mesh_payload, lazy=True)
+
+    return mesh
+
+
+def get_mesh_part_geometry(node, desc: SceneDescription) -> fbx.FbxGeometry or None:
+    future = desc.mesh_part_geos.pop(node, None)
+    if future is not None:
+        buffers = wait_mesh_part_geometry(future)
+        if buffers == meshworker.PAYLOAD_REQUIRED:
+            # the mesh was sent to another worker or evicted from the worker cache, send it again
+            metrics.count('mesh_payload_resends')
+            buffers = wait_mesh_part_geometry(submit_mesh_part(node, True))
+        if buffers is None:
+            return None
+        return fbx.geometry_from_buffers(buffers)
+
+    with metrics.stage('mesh_parse'):
+        mesh = load_mesh_part_mesh(node)
+    if mesh is None:
+        return None
+
+    with metrics.stage('mesh_transform'):
+        rbmesh.transform_mesh(mesh, *get_mesh_part_transform(node))
+    with metrics.stage('mesh_convert'):
+        return rbmesh.convert_mesh_to_fbx_geometry(mesh, 0)
+
+
 def append_to_fbx(doc, node, fbx_parent_id: int, desc: SceneDescription):
     # noinspection PyUnusedLocal
     fbx_id = 0
     if isinstance(node, MeshPart):
-        logger.message("FBX Mesh: " + node.name)
-        logger.message("    geo: " + node.mesh_id)
-        logger.message("    img: " + node.texture_id)
+        logger.debug("FBX Mesh: %s\n    geo: %s\n    img: %s", node.name, node.mesh_id, node.texture_id)
 
         xform = get_fbx_transform(node.cframe)
 
-        mesh = None
-        if node.mesh_blob is None:
-            if node.mesh_type == "Head":
-                mesh = load_mesh("./built-in/sm_head.mesh")
-                scale_xz = min(node.scale_x, node.scale_z)
-                node.scale_x = scale_xz
-                node.scale_z = scale_xz
-                node.scale_x = node.scale_x / 1.25
-                node.scale_y = node.scale_y / 1.25
-                node.scale_z = node.scale_z / 1.25
-            elif node.mesh_type == "Sphere":
-                mesh = load_mesh("./built-in/sm_sphere.mesh")
-                node.scale_x = node.scale_x / 1.45
-                node.scale_y = node.scale_y / 1.45
-                node.scale_z = node.scale_z / 1.45
-        else:
-            mesh_payload = node.mesh_blob["payload"]
-            mesh = rbmesh.parse_mesh(mesh_payload)
-
-        if mesh is None:
+        geo = get_mesh_part_geometry(node, desc)
+        if geo is None:
+            if node.mesh_blob is not None:
+                logger.warn("Can't load mesh '" + node.mesh_id + "', '" + node.name + "' is exported as a locator")
+                desc.failed_meshes.append(node.mesh_id)
             fbx_id = doc.create_locator(node.name, xform, fbx_parent_id)
         else:
             mat_id, mat_name = doc.create_material(node.name + "Mat", fbx.FbxColor4(1, 1, 1, 1))
@@ -734,18 +961,19 @@ def append_to_fbx(doc, node, fbx_parent_id: int, desc: SceneDescription):
                 dest_file = open(full_texture_file_name, 'wb')
                 dest_file.write(texture_payload)
                 dest_file.close()
+                metrics.count('saved_bytes', len(texture_payload))
+                desc.texture_files.append(texture_file_name)
 
             doc.create_texture(node.name + "Tex", texture_file_name, mat_id)
-            mesh_transform_vertices(mesh, cframe_rotation_y(3.14159),
-                                    node.offset_x, node.offset_y, node.offset_z,
-                                    node.scale_x, node.scale_y, node.scale_z)
-
-            geo = rbmesh.convert_mesh_to_fbx_geometry(mesh, 0)
-            fbx_id = doc.create_mesh(node.name, xform, geo, mat_id, fbx_parent_id)
+            with metrics.stage('fbx_geometry'):
+                fbx_id = doc.create_mesh(node.name, xform, geo, mat_id, fbx_parent_id)
+            metrics.count('meshes')
+            metrics.count('vertices', geo.get_number_of_vertices())
+            metrics.count('triangles', len(geo.indices) // 3)
 
             doc.connect_objects(fbx_id, desc.geos_layer_id)
     elif isinstance(node, Bone):
-        logger.message("FBX Bone: " + node.name)
+        logger.debug("FBX Bone: %s", node.name)
         xform = get_fbx_transform(node.cframe)
         if node.cframe_local is not None:
             xform = get_fbx_transform(node.cframe_local)
@@ -753,7 +981,7 @@ def append_to_fbx(doc, node, fbx_parent_id: int, desc: SceneDescription):
 
         doc.connect_objects(fbx_id, desc.bones_layer_id)
     elif isinstance(node, Attachment):
-        logger.message("FBX Attachment: " + node.name)
+        logger.debug("FBX Attachment: %s", node.name)
         xform = get_fbx_transform(node.cframe)
         if node.geo is None:
             fbx_id = doc.create_locator(node.name, xform, fbx_parent_id)
@@ -762,7 +990,7 @@ def append_to_fbx(doc, node, fbx_parent_id: int, desc: SceneDescription):
 
         doc.connect_objects(fbx_id, desc.attachments_layer_id)
     else:
-        logger.message("FBX Group: " + node.name)
+        logger.debug("FBX Group: %s", node.name)
         fbx_id = doc.create_group(node.name, fbx_parent_id)
 
     for child in node.children:
@@ -787,39 +1015,180 @@ def get_linearized_tree(root: Instance) -> list:
     return res
 
 
+def get_mesh_transform(cframe: CFrame,
+                       ox: float = 0, oy: float = 0, oz: float = 0,
+                       sx: float = 1, sy: float = 1, sz: float = 1) -> tuple:
+    # returns (matrix, normal_matrix, normalize_normals) for rbmesh.transform_mesh
+
+    # position: cframe * ((p + offset) * scale), folded into a single 3x4 matrix
+    m00, m01, m02 = cframe.r00 * sx, cframe.r01 * sy, cframe.r02 * sz
+    m10, m11, m12 = cframe.r10 * sx, cframe.r11 * sy, cframe.r12 * sz
+    m20, m21, m22 = cframe.r20 * sx, cframe.r21 * sy, cframe.r22 * sz
+    matrix = (m00, m01, m02, m00 * ox + m01 * oy + m02 * oz + cframe.tx,
+              m10, m11, m12, m10 * ox + m11 * oy + m12 * oz + cframe.ty,
+              m20, m21, m22, m20 * ox + m21 * oy + m22 * oz + cframe.tz)
+
+    # normal: cframe rotation * inverse transpose of scale (1 / scale), renormalized
+    # uniform scale does not change normal directions
+    is_uniform_scale = sx == sy and sy == sz
+    if is_uniform_scale:
+        isx = isy = isz = 1.0
+    else:
+        isx = 1.0 / sx if sx != 0 else 0.0
+        isy = 1.0 / sy if sy != 0 else 0.0
+        isz = 1.0 / sz if sz != 0 else 0.0
+    normal_matrix = (cframe.r00 * isx, cframe.r01 * isy, cframe.r02 * isz, 0.0,
+                     cframe.r10 * isx, cframe.r11 * isy, cframe.r12 * isz, 0.0,
+                     cframe.r20 * isx, cframe.r21 * isy, cframe.r22 * isz, 0.0)
+
+    return matrix, normal_matrix, not is_uniform_scale
+
+
 def mesh_transform_vertices(mesh: rbmesh.Mesh, cframe: CFrame,
                             ox: float = 0, oy: float = 0, oz: float = 0,
                             sx: float = 1, sy: float = 1, sz: float = 1):
+    rbmesh.transform_mesh(mesh, *get_mesh_transform(cframe, ox, oy, oz, sx, sy, sz))
+    return
 
-    for vertex in mesh.vertices:
-        x = (vertex.p_x + ox) * sx
-        y = (vertex.p_y + oy) * sy
-        z = (vertex.p_z + oz) * sz
-        vertex.p_x, vertex.p_y, vertex.p_z = cframe_transform_pos(cframe, x, y, z)
-        nx = vertex.n_x
-        ny = vertex.n_y
-        nz = vertex.n_z
-        vertex.n_x, vertex.n_y, vertex.n_z = cframe_transform_vec(cframe, nx, ny, nz)
 
-    return
+def create_fbx_document(file_name: str, output_format: str, stream=None):
+    if output_format == 'binary':
+        return fbxbin.FbxBinaryDocument(file_name, stream=stream)
+    return fbx.FbxDocument(file_name, stream, fbx_float_precision)
+
 
+def is_export_up_to_date(export_manifest: dict or None, desc_hash: str, file_folder: str) -> bool:
+    if not manifest.is_up_to_date(export_manifest, EXPORTER_VERSION, desc_hash, file_folder):
+        return False
 
-def export_roblox_model(model_desc) -> str:
-    root = parse_model_desc(model_desc)
+    # asset ids are immutable, but an asset revalidated by another export can have a new payload
+    # every downloaded asset has to be in the local asset cache with the same payload (no requests are made),
+    # without the cache (--no-cache) there is nothing to compare with and the model is exported again
+    for url, payload_hash in export_manifest.get("assets", dict()).items():
+        if url.startswith('rbxasset://'):
+            continue
+        if asset_cache is None:
+            return False
+        record = asset_cache.get_record(get_asset_fetch_url(url))
+        if record is None or record.get('hash', None) != payload_hash:
+            return False
+    return True
+
+
+def get_asset_hashes(root: Instance) -> dict:
+    # url -> payload hash of every asset used by the model, None - fetch failed
+    assets = dict()
+    for node in get_linearized_tree(root):
+        if isinstance(node, MeshPart):
+            for url, blob in ((node.mesh_id, node.mesh_blob), (node.texture_id, node.texture_blob)):
+                if url:
+                    assets[url] = blob["hash"] if blob is not None else None
+    return assets
+
+
+def export_roblox_model(model_desc, output_format: str = None, force: bool = False,
+                        failed_assets: list = None) -> str:
+    # failed_assets - URLs of the assets that could not be fetched or loaded are appended to this list
+    #                 (the model is still exported, without these meshes/textures)
+    if output_format is None:
+        output_format = fbx_format
+
+    # unchanged model is not fetched, parsed or written again (see manifest.py)
+    model_name = get_model_name(model_desc)
+    file_folder = output_folder + model_name + "/"
+    file_name = file_folder + model_name + ".fbx"
+    manifest_file_name = file_folder + model_name + ".manifest.json"
+    desc_hash = manifest.get_desc_hash(model_desc, {"format": output_format,
+                                                    "float_precision": fbx_float_precision})
+    export_manifest = manifest.load(manifest_file_name)
+    if not (force or force_export) and is_export_up_to_date(export_manifest, desc_hash, file_folder):
+        logger.message("Up to date '" + file_name + "'")
+        metrics.count('unchanged_exports')
+        # the existing export is as partial as it was
+        if failed_assets is not None:
+            failed_assets.extend(export_manifest.get("failed_assets", list()))
+        return "Saved file:" + file_name
+
+    with metrics.stage('parse_desc'):
+        root = parse_model_desc(model_desc)
     # logger.message(str(root))
+    # before build_fbx_scene() takes the hierarchy apart
+    asset_hashes = get_asset_hashes(root)
+    if failed_assets is not None:
+        failed_assets.extend(url for url, payload_hash in asset_hashes.items() if payload_hash is None)
 
-    file_folder = "./Avatars/" + root.name + "/"
-    file_name = file_folder + root.name + ".fbx"
+    logger.message("Create FBX...")
+    ensure_path_exist(file_name)
 
-    rot_y_180 = cframe_rotation_y(3.14159)
-    spike_pivot = cframe_translation(0, 0.5, 0)
+    # the old manifest must not describe the new file, even if the new manifest can't be saved
+    manifest.remove(manifest_file_name)
+
+    def write_fbx(file_handle) -> SceneDescription:
+        doc = create_fbx_document(file_name, output_format, file_handle)
+        with metrics.stage('scene'):
+            desc = build_fbx_scene(doc, root, file_folder)
+        logger.message("Save FBX '" + file_name + "'")
+        with metrics.stage('fbx_finalize'):
+            doc.finalize()
+            file_handle.flush()
+        return desc
+
+    # objects are streamed to a temporary file, so a failed export never leaves a truncated FBX behind
+    scene_desc = fileutil.write_file_atomic(file_name, write_fbx, output_format == 'binary', FBX_WRITE_BUFFER_SIZE)
+    metrics.count('saved_bytes', os.path.getsize(file_name))
+    failed_meshes = sorted(set(scene_desc.failed_meshes))
+    if failed_assets is not None:
+        failed_assets.extend(failed_meshes)
+    output_files = [model_name + ".fbx"] + sorted(set(scene_desc.texture_files))
+    manifest.save(manifest_file_name, manifest.create(EXPORTER_VERSION, desc_hash, asset_hashes, failed_meshes,
+                                                      file_folder, output_files))
+    return "Saved file:" + file_name
 
-    logger.message("Create FBX...")
-    doc = fbx.FbxDocument(file_name)
-    sphere_geo = load_mesh_as_fbx_geo("./built-in/sphere.mesh", rot_y_180)
-    spike_geo = load_mesh_as_fbx_geo("./built-in/spike.mesh", cframe_multiply(rot_y_180, spike_pivot))
+
+def get_model_name(model_desc) -> str:
+    # name of the root object (the one without a parent), the same as root.name after parse_model_desc()
+    for dm_object in model_desc.values():
+        if resolve_id_to_reference(dm_object.get('Parent', None), model_desc) is None:
+            return str(dm_object.get('Name', None))
+    return 'Unnamed'
+
+
+def run_export_job(model_desc, output_format: str = None, profile: str = None, force: bool = False) -> dict:
+    # export_roblox_model() with per export metrics, used by the HTTP server and the batch mode
+    # profile - profiling.MODES, reports are saved next to the exported model
+    profile = profile or profile_mode
+    profile_files = None
+    failed_assets = list()
+    collector = metrics.begin_export()
+    succeeded = False
+    try:
+        with metrics.stage('export'):
+            if profile is not None:
+                name = get_model_name(model_desc)
+                now = time.time()
+                stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + '-{0:03d}'.format(int(now * 1000) % 1000)
+                file_prefix = output_folder + name + "/" + name + "." + stamp
+                result, profile_files = profiling.run(export_roblox_model,
+                                                      (model_desc, output_format, force, failed_assets),
+                                                      file_prefix, profile, profile_top)
+            else:
+                result = export_roblox_model(model_desc, output_format, force, failed_assets)
+        succeeded = True
+    finally:
+        metrics.end_export(collector, succeeded)
+    job_result = {"result": result, "metrics": collector.to_dict() if collector is not None else None,
+                  "failed_assets": failed_assets}
+    if profile_files is not None:
+        job_result["profile"] = profile_files
+    return job_result
+
+
+def build_fbx_scene(doc, root: Instance, file_folder: str) -> SceneDescription:
+    # returns the scene description: texture files written to file_folder, meshes that could not be loaded
+    sphere_geo, spike_geo = get_attachment_geos()
 
     scene_desc = SceneDescription()
+    submit_mesh_parts(get_linearized_tree(root), scene_desc)
     scene_desc.textures_folder = file_folder
     scene_desc.attachments_material_id, _ = doc.create_material("AttachmentMat", fbx.FbxColor4(1, 0.8, 0.8, 1))
     scene_desc.attachments_layer_id = doc.create_layer("Attachments", fbx.FbxColor4(1, 0, 0))
@@ -841,7 +1210,7 @@ def export_roblox_model(model_desc) -> str:
         if isinstance(child, Accessory):
             child.parent = None
             accessories.append(child)
-            logger.message("Accessory: " + child.name)
+            logger.debug("Accessory: %s", child.name)
     for accessory in accessories:
         root.children.remove(accessory)
 
@@ -931,7 +1300,7 @@ def export_roblox_model(model_desc) -> str:
             bones_to_process.append((parent_bone, child_part, bone))
 
         for parent_bone, child_part, child_bone in bones_to_process:
-            logger.message(parent_bone.name + " -> " + child_bone.name + "/" + child_part.name)
+            logger.debug("%s -> %s/%s", parent_bone.name, child_bone.name, child_part.name)
             child_bone.m6d = None
             child_bone.parent = parent_bone
             parent_bone.children.append(child_bone)
@@ -1056,19 +1425,51 @@ def export_roblox_model(model_desc) -> str:
 
                     append_to_fbx(doc, accessory_node, root_accessory_id, scene_desc)
 
-    text = doc.finalize()
+    return scene_desc
 
-    logger.message("Save FBX '" + file_name + "'")
-    ensure_path_exist(file_name)
-    file_handle = open(file_name, 'w+')
-    file_handle.write(text)
-    file_handle.close()
 
-    return "Saved file:" + file_name
+def get_server_metrics() -> dict:
+    res = metrics.get_totals()
+    if mesh_workers is not None:
+        # every worker has its own cache, hits/misses are counted by the exports
+        worker_caches = list(mesh_worker_caches.values())
+        res["mesh_cache"] = {"hits": res["counters"].get("mesh_cache_hits", 0),
+                             "misses": res["counters"].get("mesh_cache_misses", 0),
+                             "entries": sum(entries for entries, _ in worker_caches),
+                             "size_bytes": sum(size for _, size in worker_caches),
+                             "workers": len(worker_caches)}
+    else:
+        res["mesh_cache"] = {"hits": mesh_cache.hits,
+                             "misses": mesh_cache.misses,
+                             "entries": len(mesh_cache.entries),
+                             "size_bytes": mesh_cache.total_size}
+    res["jobs"] = {"pending": export_jobs.pending if export_jobs is not None else 0}
+    return res
 
 
 class ForgeHTTPArtServerRequestHandler(BaseHTTPRequestHandler):
 
+    def send_json(self, code: int, value):
+        self.send_response(code)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(bytes(json.dumps(value), "utf8"))
+
+    def send_text(self, code: int, text: str):
+        self.send_response(code)
+        self.send_header('Content-type', 'text/html')
+        self.end_headers()
+        self.wfile.write(bytes(text, "utf8"))
+
+    def send_job_result(self, job: jobqueue.Job):
+        if job.status == jobqueue.JOB_FAILED:
+            self.send_error(500, "Export failed", job.error)
+        elif job.result["metrics"] is not None:
+            # {"result": "Saved file:...", "metrics": {...}}
+            self.send_json(200, job.result)
+        else:
+            self.send_text(200, job.result["result"])
+
     # noinspection PyPep8Naming
     def do_POST(self):
 
@@ -1076,21 +1477,65 @@ class ForgeHTTPArtServerRequestHandler(BaseHTTPRequestHandler):
         body = self.rfile.read(content_length).decode('utf-8')
 
         model_description = json.loads(body)
+
+        # optional '?format=ascii|binary'
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        output_format = query.get('format', [None])[0]
+        if output_format is not None and output_format not in FBX_FORMATS:
+            self.send_error(400, "Unknown FBX format '" + output_format + "'")
+            return
+
+        # optional '?profile=cpu|memory|all' or 'X-Profile' header
+        profile = query.get('profile', [self.headers.get('X-Profile', None)])[0]
+        if profile is not None and profile not in profiling.MODES:
+            self.send_error(400, "Unknown profile mode '" + profile + "'")
+            return
+
+        # optional '?force=1' - export even if the model is up to date
+        force = query.get('force', ['0'])[0].lower() in ('1', 'true', 'yes')
+
         # result = fetch_roblox_model_to_disk(model_description)
-        result = export_roblox_model(model_description)
+        job = export_jobs.submit(run_export_job, model_description, output_format, profile, force)
+        if job is None:
+            self.send_error(503, "Too many pending exports")
+            return
+
+        # 'POST /jobs' returns the job id right away, the result can be polled with 'GET /jobs/<id>'
+        if url.path.rstrip('/') == '/jobs':
+            self.send_json(202, job.to_dict())
+            return
+
+        job.wait()
+        self.send_job_result(job)
+        return
 
-        self.send_response(200)
+    def send_job_status(self, path: str):
+        # /jobs/<id> - job status, /jobs/<id>/result - export result (202 with the status while not finished)
+        parts = path.strip('/').split('/')
+        job = export_jobs.get(parts[1]) if len(parts) in (2, 3) else None
+        if job is None or (len(parts) == 3 and parts[2] != 'result'):
+            self.send_error(404, "Unknown job")
+            return
 
-        # Send headers
-        self.send_header('Content-type', 'text/html')
-        self.end_headers()
+        if len(parts) == 3 and job.is_finished():
+            self.send_job_result(job)
+            return
 
-        # Write content as utf-8 data
-        self.wfile.write(bytes(result, "utf8"))
+        self.send_json(200 if len(parts) == 2 else 202, job.to_dict())
         return
 
     # noinspection PyPep8Naming
     def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path.startswith('/jobs/'):
+            self.send_job_status(path)
+            return
+
+        if path.rstrip('/') == '/metrics':
+            self.send_json(200, get_server_metrics())
+            return
+
         self.send_response(200)
         self.send_header("Content-type", "application/json")
         self.end_headers()
@@ -1156,24 +1601,227 @@ class ForgeHTTPArtServerRequestHandler(BaseHTTPRequestHandler):
         return
 
 
+def read_batch_descriptions(path: str):
+    # yields (source, model description or None, error) for every saved model description
+    # path - folder with one .json file per model or a .jsonl file with one model per line
+    if os.path.isdir(path):
+        for file_name in sorted(os.listdir(path)):
+            if not file_name.endswith('.json'):
+                continue
+            file_path = os.path.join(path, file_name)
+            try:
+                with open(file_path, 'r', encoding='utf-8') as desc_file:
+                    yield file_path, json.load(desc_file), None
+            except (OSError, ValueError) as ex:
+                yield file_path, None, str(ex)
+        return
+
+    with open(path, 'r', encoding='utf-8') as desc_file:
+        for line_number, line in enumerate(desc_file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            source = path + ":" + str(line_number)
+            try:
+                yield source, json.loads(line), None
+            except ValueError as ex:
+                yield source, None, str(ex)
+
+
+def get_percentile(sorted_values: list, percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percentile / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_batch(path: str, summary_file_name: str) -> bool:
+    # exports all saved model descriptions without the Studio plugin
+    # returns False if any export failed or is partial (some of its assets could not be fetched)
+    logger.message('Batch export "{0}"'.format(path))
+    start_time = time.time()
+
+    entries = list()
+    pending = collections.deque()
+    for source, model_description, error in read_batch_descriptions(path):
+        job = None
+        if model_description is not None:
+            job = export_jobs.submit(run_export_job, model_description, None)
+            while job is None:
+                # queue is full, wait for the oldest export
+                pending.popleft().wait()
+                job = export_jobs.submit(run_export_job, model_description, None)
+            pending.append(job)
+        entries.append((source, job, error))
+
+    exports = list()
+    export_times = list()
+    for source, job, error in entries:
+        if job is None:
+            exports.append({"source": source, "status": jobqueue.JOB_FAILED, "error": error})
+            continue
+        job.wait()
+        entry = {"source": source, "status": job.status, "result": None, "error": job.error,
+                 "queue_seconds": job.started - job.submitted, "export_seconds": job.finished - job.started}
+        if job.status == jobqueue.JOB_DONE:
+            entry["result"] = job.result["result"]
+            entry["metrics"] = job.result["metrics"]
+            entry["fetch_failures"] = len(job.result["failed_assets"])
+            entry["failed_assets"] = job.result["failed_assets"]
+            if entry["fetch_failures"] > 0:
+                # exported without some meshes/textures
+                entry["status"] = BATCH_PARTIAL
+            export_times.append(entry["export_seconds"])
+        exports.append(entry)
+
+    export_times.sort()
+    failed = [entry for entry in exports if entry["status"] == jobqueue.JOB_FAILED]
+    partial = [entry for entry in exports if entry["status"] == BATCH_PARTIAL]
+    summary = {"source": path,
+               "total": len(exports),
+               "succeeded": len(exports) - len(failed) - len(partial),
+               "partial": len(partial),
+               "failed": len(failed),
+               "wall_seconds": time.time() - start_time,
+               "export_seconds": {"total": sum(export_times),
+                                  "mean": sum(export_times) / len(export_times) if export_times else 0.0,
+                                  "p50": get_percentile(export_times, 50),
+                                  "p95": get_percentile(export_times, 95),
+                                  "max": export_times[-1] if export_times else 0.0},
+               "metrics": metrics.get_totals(),
+               "exports": exports}
+
+    ensure_path_exist(os.path.abspath(summary_file_name))
+    with open(summary_file_name, 'w') as summary_file:
+        json.dump(summary, summary_file, indent=2)
+
+    logger.message('Batch export: {0} exported, {1} partial, {2} failed, {3:.1f}s. Summary "{4}"'.format(
+        summary["succeeded"], summary["partial"], summary["failed"], summary["wall_seconds"], summary_file_name))
+    for entry in partial:
+        logger.warn("Batch export partial '" + entry["source"] + "', assets not fetched: " +
+                    ", ".join(entry["failed_assets"]))
+    for entry in failed:
+        logger.warn("Batch export failed '" + entry["source"] + "': " + str(entry["error"]))
+    return len(failed) == 0 and len(partial) == 0
+
+
 def signal_handler(_signal, _frame):
     logger.message('\nAvatar FBX Exporter Server closed by user request.')
     sys.exit(0)
 
 
 def main():
+    global asset_cache, cache_fresh_seconds, fetch_workers, fetch_policy, asset_fetch_endpoint, fbx_format
+    global fbx_float_precision, mesh_cache, export_jobs, mesh_workers, profile_mode, profile_top, force_export
+
     if sys.version_info[0] != 3:
         logger.fatal("Python3 required")
 
+    parser = argparse.ArgumentParser(description='Roblox Avatar FBX Exporter Server')
+    parser.add_argument('--cache-dir', default='./AssetCache/',
+                        help='persistent asset cache folder (default: %(default)s)')
+    parser.add_argument('--cache-size-mb', type=int, default=2048,
+                        help='asset cache size limit in megabytes (default: %(default)s)')
+    parser.add_argument('--verify-cache', action='store_true',
+                        help='verify SHA-256 of cached assets on every read')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='disable persistent asset cache')
+    parser.add_argument('--cache-fresh-seconds', type=float, default=cache_fresh_seconds,
+                        help='cached assets validated less than this number of seconds ago are used without '
+                             'revalidation (default: %(default)s)')
+    parser.add_argument('--mesh-cache-mb', type=int, default=256,
+                        help='memory limit of the parsed mesh cache in megabytes (default: %(default)s)')
+    parser.add_argument('--fetch-workers', type=int, default=fetch_workers,
+                        help='max number of assets fetched in parallel (default: %(default)s)')
+    parser.add_argument('--fetch-retries', type=int, default=4,
+                        help='max number of retries for 429/5xx responses and connection errors (default: %(default)s)')
+    parser.add_argument('--negative-cache-seconds', type=float, default=900,
+                        help='assets failed with 403/404 are not requested again for this number of seconds '
+                             '(default: %(default)s)')
+    parser.add_argument('--max-requests-per-second', type=float, default=20,
+                        help='global asset request rate limit, 0 - unlimited (default: %(default)s)')
+    parser.add_argument('--asset-endpoint', default=asset_fetch_endpoint,
+                        help='asset delivery URL, asset id is appended to it (default: %(default)s)')
+    parser.add_argument('--fbx-format', choices=FBX_FORMATS, default=fbx_format,
+                        help='default FBX output format (default: %(default)s)')
+    parser.add_argument('--fbx-float-precision', type=int, default=None,
+                        help='significant digits of ASCII FBX geometry arrays, 9 is enough for float32 mesh data '
+                             '(default: shortest exact representation)')
+    parser.add_argument('--export-threads', type=int, default=4,
+                        help='max number of avatars exported at the same time (default: %(default)s)')
+    parser.add_argument('--max-pending-jobs', type=int, default=64,
+                        help='max number of queued and running exports, new exports are rejected with 503 '
+                             '(default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='number of mesh processing worker processes, 0 - process meshes in the export threads '
+                             '(default: number of CPU cores, %(default)s)')
+    parser.add_argument('--log-level', choices=tuple(logger.LEVELS), default='info',
+                        help='minimal level of logged messages, per node messages are logged at debug level '
+                             '(default: %(default)s)')
+    parser.add_argument('--log-format', choices=('text', 'json'), default='text',
+                        help='text or one JSON object per line (default: %(default)s)')
+    parser.add_argument('--log-file', default=None,
+                        help='append log to this file instead of the console')
+    parser.add_argument('--no-metrics', action='store_true',
+                        help='do not collect per export timings and counters')
+    parser.add_argument('--profile', default=None, choices=profiling.MODES,
+                        help='profile every export with cProfile (cpu) and/or tracemalloc (memory), reports are '
+                             'saved to the model folder (default: only exports requested with ?profile=)')
+    parser.add_argument('--profile-top', type=int, default=30,
+                        help='functions / allocation sites in the profile reports (default: %(default)s)')
+    parser.add_argument('--force', action='store_true',
+                        help='re-export models even if their manifest is up to date')
+    parser.add_argument('--batch', default=None,
+                        help='export saved model descriptions (a folder of .json files or a .jsonl file) '
+                             'and exit, no server is started')
+    parser.add_argument('--batch-summary', default='./Avatars/batch_summary.json',
+                        help='batch export summary file (default: %(default)s)')
+    args = parser.parse_args()
+
+    # console output of the interactive server is not buffered
+    log_stream = open(args.log_file, 'a', encoding='utf-8') if args.log_file is not None else None
+    logger.configure(logger.LEVELS[args.log_level], args.log_format, log_stream,
+                     buffered=args.batch is not None or log_stream is not None)
+
+    fetch_workers = max(1, args.fetch_workers)
+    metrics.enabled = not args.no_metrics
+    profile_mode = args.profile
+    profile_top = max(1, args.profile_top)
+    force_export = args.force
+    cache_fresh_seconds = args.cache_fresh_seconds
+    asset_fetch_endpoint = args.asset_endpoint
+    fbx_format = args.fbx_format
+    fbx_float_precision = args.fbx_float_precision
+    mesh_cache = rbmesh.MeshCache(args.mesh_cache_mb * 1024 * 1024)
+    if args.workers > 0:
+        # every worker has its own parsed mesh cache
+        mesh_workers = meshworker.create_pool(args.workers, args.mesh_cache_mb * 1024 * 1024 // args.workers)
+        logger.message('Mesh workers: {0} processes'.format(args.workers))
+    export_jobs = jobqueue.JobQueue(args.export_threads, args.max_pending_jobs)
+    fetch_policy = fetchpolicy.FetchPolicy(max_retries=max(0, args.fetch_retries),
+                                           negative_ttl=args.negative_cache_seconds,
+                                           max_requests_per_second=args.max_requests_per_second)
+    if not args.no_cache:
+        asset_cache = assetcache.AssetCache(args.cache_dir, args.cache_size_mb * 1024 * 1024, args.verify_cache)
+        logger.message('Asset cache: "{0}"'.format(args.cache_dir))
+
+    warm_built_in_assets()
+
     signal.signal(signal.SIGINT, signal_handler)
 
+    if args.batch is not None:
+        if not run_batch(args.batch, args.batch_summary):
+            sys.exit(1)
+        return
+
     server_address = ('127.0.0.1', 49999)
 
-    httpd = HTTPServer(server_address, ForgeHTTPArtServerRequestHandler)
+    httpd = ThreadingHTTPServer(server_address, ForgeHTTPArtServerRequestHandler)
     logger.message('Roblox Avatar FBX Exporter Server "{0}:{1}"'.format(server_address[0], server_address[1]))
     logger.message('by Sergey Makeev\n')
     logger.message('Press Ctrl+C to exit')
     httpd.serve_forever()
 
 
-main()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+# The MIT License (MIT)
+#
+# 	Copyright (c) 2019 Sergey Makeev
+#
+# 	Permission is hereby granted, free of charge, to any person obtaining a copy
+# 	of this software and associated documentation files (the "Software"), to deal
+# 	in the Software without restriction, including without limitation the rights
+# 	to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# 	copies of the Software, and to permit persons to whom the Software is
+# 	furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in
+# 	all copies or substantial portions of the Software.
+#
+# 	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# 	THE SOFTWARE.
+import os
+import json
+import time
+import hashlib
+import threading
+import logger
+import fileutil
+
+#
+# Persistent content-addressed asset cache
+#
+# <root>/index/<xx>/<sha256(url)>.json - asset URL -> asset record (payload hash, cdn_url, ts, ...)
+# <root>/blobs/<xx>/<sha256(payload)> - asset payload, shared by all URLs with the same content
+#
+# Every file is written to a temporary file first and then moved in place, so concurrent readers
+# (other threads or other exporter processes) never see partially written data.
+# Blob modification time is used as the 'last used' time for LRU eviction.
+#
+# Records also keep HTTP validators (ETag / Last-Modified) and the time the asset was last
+# validated against the server, so the caller can decide whether a conditional request is needed.
+#
+
+
+def _remove_file(file_path: str):
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+
+
+class AssetCache:
+    def __init__(self, root: str, max_size: int, verify: bool = False):
+        self.root = root
+        self.max_size = max_size
+        self.verify = verify
+        self.lock = threading.Lock()
+        # computed on first write
+        self.total_size = None
+
+    def _index_path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, 'index', key[:2], key + '.json')
+
+    def _blob_path(self, payload_hash: str) -> str:
+        return os.path.join(self.root, 'blobs', payload_hash[:2], payload_hash)
+
+    def get_record(self, url: str) -> dict or None:
+        try:
+            with open(self._index_path(url), 'r') as index_file:
+                record = json.load(index_file)
+        except (OSError, ValueError):
+            return None
+
+        if record.get('url', None) != url:
+            return None
+        return record
+
+    def is_fresh(self, record: dict, fresh_seconds: float) -> bool:
+        return time.time() - record.get('validated', 0) < fresh_seconds
+
+    def get(self, url: str) -> dict or None:
+        # returns asset blob in the same format as fetch_asset or None
+        record = self.get_record(url)
+        if record is None:
+            return None
+
+        payload_hash = record['hash']
+        blob_path = self._blob_path(payload_hash)
+        try:
+            with open(blob_path, 'rb') as blob_file:
+                payload = blob_file.read()
+            # mark as recently used
+            os.utime(blob_path)
+        except OSError:
+            # blob was evicted
+            _remove_file(self._index_path(url))
+            return None
+
+        if self.verify and hashlib.sha256(payload).hexdigest() != payload_hash:
+            logger.warn("Asset cache: corrupted blob '" + blob_path + "', url '" + url + "'")
+            _remove_file(blob_path)
+            _remove_file(self._index_path(url))
+            return None
+
+        return {"hash": payload_hash,
+                "cdn_url": record['cdn_url'],
+                "ts": record['ts'],
+                "code": record['code'],
+                "fetched_bytes": 0,
+                "payload_bytes": len(payload),
+                "payload": payload,
+                "cached": True}
+
+    def put(self, url: str, blob: dict):
+        payload_hash = blob['hash']
+        payload = blob['payload']
+        blob_path = self._blob_path(payload_hash)
+        record = {"url": url,
+                  "hash": payload_hash,
+                  "cdn_url": blob['cdn_url'],
+                  "ts": blob['ts'],
+                  "code": blob['code'],
+                  "etag": blob.get('etag', None),
+                  "last_modified": blob.get('last_modified', None),
+                  "validated": time.time()}
+        try:
+            added_size = 0
+            if not os.path.isfile(blob_path):
+                fileutil.write_file_atomic(blob_path, payload)
+                added_size = len(payload)
+            fileutil.write_file_atomic(self._index_path(url), json.dumps(record).encode('utf-8'))
+        except OSError as ex:
+            logger.warn("Asset cache: can't store '" + url + "': " + str(ex))
+            return
+
+        with self.lock:
+            if self.total_size is None:
+                self.total_size = self._scan_size()
+            else:
+                self.total_size += added_size
+            if self.total_size > self.max_size:
+                self._evict()
+
+    def revalidated(self, url: str, record: dict):
+        # server confirmed that cached asset is still up to date (304 Not Modified)
+        record['validated'] = time.time()
+        try:
+            fileutil.write_file_atomic(self._index_path(url), json.dumps(record).encode('utf-8'))
+        except OSError as ex:
+            logger.warn("Asset cache: can't update '" + url + "': " + str(ex))
+
+    def _list_blobs(self) -> list:
+        blobs = list()
+        blobs_root = os.path.join(self.root, 'blobs')
+        for dir_path, _, file_names in os.walk(blobs_root):
+            for file_name in file_names:
+                if file_name.startswith(fileutil.TEMP_FILE_PREFIX):
+                    continue
+                file_path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, file_path))
+        return blobs
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._list_blobs())
+
+    def _evict(self):
+        # drop least recently used blobs, index entries pointing to evicted blobs are treated as misses
+        blobs = self._list_blobs()
+        blobs.sort()
+        total_size = sum(size for _, size, _ in blobs)
+        for _, size, file_path in blobs:
+            if total_size <= self.max_size:
+                break
+            _remove_file(file_path)
+            total_size -= size
+        self.total_size = total_size
@@ -0,0 +1,470 @@
+# The MIT License (MIT)
+#
+# 	Copyright (c) 2019 Sergey Makeev
+#
+# 	Permission is hereby granted, free of charge, to any person obtaining a copy
+# 	of this software and associated documentation files (the "Software"), to deal
+# 	in the Software without restriction, including without limitation the rights
+# 	to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# 	copies of the Software, and to permit persons to whom the Software is
+# 	furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in
+# 	all copies or substantial portions of the Software.
+#
+# 	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# 	THE SOFTWARE.
+#
+# Micro-benchmarks for the exporter hot paths
+#
+# usage: python benchmark.py [mesh files...]
+#
+import io
+import os
+import sys
+import glob
+import time
+import struct
+import contextlib
+import fbx
+import rbmesh
+
+
+def _write_vertices(out, num_vertices: int):
+    for i in range(num_vertices):
+        x = float(i % 128) * 0.01
+        y = float(i // 128) * 0.01
+        out.write(struct.pack('<9f4B', x, y, (i % 7) * 0.1, 0.0, 0.0, 1.0, x, 1.0 - y, 0.0, 255, 255, 255, 255))
+
+
+def _write_faces(out, num_faces: int):
+    for i in range(num_faces):
+        if i % 2 == 0:
+            out.write(struct.pack('<3I', i, i + 1, i + 2))
+        else:
+            out.write(struct.pack('<3I', i + 1, i, i + 2))
+
+
+def _get_lods(num_faces: int, num_lods: int) -> list:
+    step = num_faces // num_lods
+    lods = [min(lod * step, num_faces) for lod in range(num_lods)]
+    lods.append(num_faces)
+    return lods
+
+
+def _write_chunk(out, chunk_type: bytes, chunk_version: int, chunk_data: bytes):
+    out.write(chunk_type.ljust(8, b'\x00'))
+    out.write(struct.pack('<II', chunk_version, len(chunk_data)))
+    out.write(chunk_data)
+
+
+def make_chunked_mesh(version: int, num_vertices: int, num_lods: int = 1, draco: bool = False) -> bytes:
+    # deterministic synthetic v6.00/v7.00 mesh: COREMESH, LODS, SKINNING and FACS chunks
+    # draco: COREMESH v2 (compressed, not supported by the exporter) with a dummy payload
+    num_faces = num_vertices - 2
+    out = io.BytesIO()
+    out.write(b'version 6.00\n' if version == 6 else b'version 7.00\n')
+
+    core_mesh = io.BytesIO()
+    if draco:
+        core_mesh.write(b'DRACO' + bytes(64))
+    else:
+        core_mesh.write(struct.pack('<I', num_vertices))
+        _write_vertices(core_mesh, num_vertices)
+        core_mesh.write(struct.pack('<I', num_faces))
+        _write_faces(core_mesh, num_faces)
+    _write_chunk(out, b'COREMESH', 2 if draco else 1, core_mesh.getvalue())
+
+    lods = _get_lods(num_faces, num_lods)
+    _write_chunk(out, b'LODS', 1, struct.pack('<HBI', 3, 1, len(lods)) + struct.pack('<' + str(len(lods)) + 'I', *lods))
+
+    # skinning: everything is bound to the single joint, the exporter skips it
+    skinning = io.BytesIO()
+    skinning.write(struct.pack('<I', num_vertices))
+    skinning.write(struct.pack('<8B', 0, 0, 0, 0, 255, 0, 0, 0) * num_vertices)
+    skinning.write(struct.pack('<I', 0))
+    _write_chunk(out, b'SKINNING', 1, skinning.getvalue())
+    _write_chunk(out, b'FACS', 1, struct.pack('<I', 0))
+    return out.getvalue()
+
+
+def make_binary_mesh(version: int, num_vertices: int, num_lods: int = 1) -> bytes:
+    # deterministic synthetic mesh: a triangle strip, split into 'num_lods' face ranges
+    if version == 6 or version == 7:
+        return make_chunked_mesh(version, num_vertices, num_lods)
+
+    num_faces = num_vertices - 2
+    out = io.BytesIO()
+    if version == 2:
+        out.write(b'version 2.00\n')
+        out.write(struct.pack('<HBBII', 12, 40, 12, num_vertices, num_faces))
+    elif version == 3:
+        out.write(b'version 3.00\n')
+        out.write(struct.pack('<HBBHHII', 16, 40, 12, 4, num_lods + 1, num_vertices, num_faces))
+    elif version == 4 or version == 5:
+        out.write(b'version 4.00\n' if version == 4 else b'version 5.00\n')
+        out.write(struct.pack('<HHIIHHIHBB', 24 if version == 4 else 32, 3, num_vertices, num_faces,
+                              num_lods + 1, 1, 5, 1, num_lods, 0))
+        if version == 5:
+            out.write(struct.pack('<II', 0, 0))
+    else:
+        raise ValueError("Unsupported mesh version: " + str(version))
+
+    _write_vertices(out, num_vertices)
+
+    if version >= 4:
+        # skinning: everything is bound to the single joint
+        for i in range(num_vertices):
+            out.write(struct.pack('<8B', 0, 0, 0, 0, 255, 0, 0, 0))
+
+    _write_faces(out, num_faces)
+
+    if version >= 3:
+        lods = _get_lods(num_faces, num_lods)
+        out.write(struct.pack('<' + str(len(lods)) + 'I', *lods))
+
+    if version >= 4:
+        # joint, joint name table, skinning subset
+        out.write(struct.pack('<IHHf12f', 0, 0xffff, 0, 1.0, 1, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0))
+        out.write(b'Root\x00')
+        out.write(struct.pack('<5I', 0, num_faces, 0, num_vertices, 1))
+        out.write(struct.pack('<26H', *([0] + [0xffff] * 25)))
+
+    return out.getvalue()
+
+
+def make_text_mesh(version: str, num_vertices: int) -> bytes:
+    # deterministic synthetic ascii mesh, version: '1.00' or '1.01', every triangle has its own 3 vertices
+    num_faces = num_vertices // 3
+    pairs = list()
+    for i in range(num_faces * 3):
+        x = float(i % 128) * 0.01
+        y = float(i // 128) * 0.01
+        pairs.append("[{0:.4f},{1:.4f},{2:.4f}][0,0,1][{0:.4f},{3:.4f},0]".format(x, y, (i % 7) * 0.1, y - 1.0))
+    if version != '1.00' and version != '1.01':
+        raise ValueError("Unsupported mesh version: " + version)
+    return ('version ' + version + '\n' + str(num_faces) + '\n' + ''.join(pairs) + '\n').encode('ascii')
+
+
+def parse_mesh_per_field(content: bytes) -> rbmesh.Mesh:
+    # reference decoder, reads every field with its own struct.unpack call (binary meshes only)
+    data_stream = io.BytesIO(content)
+    header = data_stream.read(13)
+    version = int(header[8:9])
+    mesh = rbmesh.Mesh()
+
+    num_joints = 0
+    num_lods = 0
+    chunk_lods = None
+    if version == 6 or version == 7:
+        # chunk headers, only COREMESH and LODS are decoded
+        core_mesh = None
+        while True:
+            chunk_header = data_stream.read(16)
+            if len(chunk_header) < 16:
+                break
+            chunk_type = chunk_header[:8].rstrip(b'\x00')
+            chunk_version = struct.unpack('<I', chunk_header[8:12])[0]
+            chunk_data = data_stream.read(struct.unpack('<I', chunk_header[12:16])[0])
+            if chunk_type == b'COREMESH':
+                assert chunk_version == 1
+                core_mesh = chunk_data
+            elif chunk_type == b'LODS' and chunk_version == 1:
+                lods_count = struct.unpack('<I', chunk_data[3:7])[0]
+                chunk_lods = [struct.unpack('<I', chunk_data[7 + i * 4:11 + i * 4])[0] for i in range(lods_count)]
+        data_stream = io.BytesIO(core_mesh)
+        sizeof_mesh_vertex = 40
+        num_vertices = struct.unpack('<I', data_stream.read(4))[0]
+        num_faces = struct.unpack('<I', core_mesh[4 + num_vertices * 40:8 + num_vertices * 40])[0]
+    elif version == 2:
+        _, sizeof_mesh_vertex, _, num_vertices, num_faces = struct.unpack('<HBBII', data_stream.read(12))
+    elif version == 3:
+        _, sizeof_mesh_vertex, _, _, num_lods, num_vertices, num_faces = struct.unpack('<HBBHHII',
+                                                                                      data_stream.read(16))
+    else:
+        sizeof_mesh_header = struct.unpack('<H', data_stream.read(2))[0]
+        _, num_vertices, num_faces, num_lods, num_joints, _, _, _, _ = struct.unpack('<HIIHHIHBB',
+                                                                                     data_stream.read(22))
+        data_stream.read(sizeof_mesh_header - 24)
+        sizeof_mesh_vertex = 40
+
+    for i in range(0, num_vertices):
+        pos_x = struct.unpack('f', data_stream.read(4))[0]
+        pos_y = struct.unpack('f', data_stream.read(4))[0]
+        pos_z = struct.unpack('f', data_stream.read(4))[0]
+        nrm_x = struct.unpack('f', data_stream.read(4))[0]
+        nrm_y = struct.unpack('f', data_stream.read(4))[0]
+        nrm_z = struct.unpack('f', data_stream.read(4))[0]
+        t_u = struct.unpack('f', data_stream.read(4))[0]
+        t_v = struct.unpack('f', data_stream.read(4))[0]
+        t_w = struct.unpack('f', data_stream.read(4))[0]
+        col_r, col_g, col_b, col_a = 0xff, 0xff, 0xff, 0xff
+        if sizeof_mesh_vertex == 40:
+            col_r = struct.unpack('B', data_stream.read(1))[0]
+            col_g = struct.unpack('B', data_stream.read(1))[0]
+            col_b = struct.unpack('B', data_stream.read(1))[0]
+            col_a = struct.unpack('B', data_stream.read(1))[0]
+        mesh.append_vertex(rbmesh.Vertex(pos_x, pos_y, pos_z, nrm_x, nrm_y, nrm_z, t_u, t_v, t_w,
+                                         col_r, col_g, col_b, col_a))
+
+    if num_joints > 0:
+        for i in range(0, num_vertices * 8):
+            struct.unpack('B', data_stream.read(1))
+
+    if version == 6 or version == 7:
+        # face count
+        data_stream.read(4)
+
+    for i in range(0, num_faces):
+        index0 = struct.unpack('I', data_stream.read(4))[0]
+        index1 = struct.unpack('I', data_stream.read(4))[0]
+        index2 = struct.unpack('I', data_stream.read(4))[0]
+        mesh.append_triangle(rbmesh.Triangle(index0, index1, index2))
+
+    lods = []
+    for i in range(0, num_lods):
+        lods.append(struct.unpack('I', data_stream.read(4))[0])
+    if chunk_lods is not None:
+        lods = chunk_lods
+    if len(lods) == 0:
+        lods = [0, num_faces]
+    mesh.assign_lod_data(lods)
+    return mesh
+
+
+def meshes_are_equal(a: rbmesh.Mesh, b: rbmesh.Mesh) -> bool:
+    return a.positions == b.positions and a.normals == b.normals and a.uvs == b.uvs and \
+        a.colors == b.colors and a.indices == b.indices and a.lod_data == b.lod_data
+
+
+def time_best(func, repeat: int) -> float:
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_parse_mesh(payloads: list, repeat: int = 5):
+    print("parse_mesh: per-field reference vs bulk decoder (best of " + str(repeat) + ")")
+    print("{0:<40} {1:>8} {2:>12} {3:>12} {4:>8}".format("mesh", "verts", "per-field,ms", "bulk,ms", "speedup"))
+    for name, payload in payloads:
+        mesh = rbmesh.parse_mesh(payload)
+        reference = parse_mesh_per_field(payload)
+        if not meshes_are_equal(mesh, reference):
+            print(name + ": decoded meshes are not equal!")
+            sys.exit(1)
+
+        t_ref = time_best(lambda: parse_mesh_per_field(payload), repeat)
+        t_bulk = time_best(lambda: rbmesh.parse_mesh(payload), repeat)
+        print("{0:<40} {1:>8} {2:>12.3f} {3:>12.3f} {4:>7.1f}x".format(
+            name, mesh.get_number_of_vertices(), t_ref * 1000.0, t_bulk * 1000.0, t_ref / t_bulk))
+
+
+def check_rejected_meshes(payloads: list):
+    # unsupported and broken chunked meshes are skipped (parse_mesh returns None), they don't fail the export
+    print("parse_mesh: rejected meshes")
+    for name, payload in payloads:
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log):
+            mesh = rbmesh.parse_mesh(payload)
+        if mesh is not None:
+            print(name + ": mesh is not rejected!")
+            sys.exit(1)
+        print("{0:<40} {1}".format(name, log.getvalue().strip()))
+
+
+def convert_mesh_per_vertex(mesh: rbmesh.Mesh, lod: int = 0) -> fbx.FbxGeometry:
+    # reference converter, visits every index reference and assigns vertices one by one
+    geo = fbx.FbxGeometry()
+    indices = mesh.get_lod_indices(lod)
+    if len(indices) == 0:
+        return geo
+
+    remap = dict()
+    for index in sorted(set(indices)):
+        remap[index] = len(remap)
+
+    number_of_vertices = len(remap)
+    positions = [0.0] * (number_of_vertices * 3)
+    normals = [0.0] * (number_of_vertices * 3)
+    uvs = [0.0] * (number_of_vertices * 2)
+    for index in indices:
+        offset = index * 3
+        vertex_index = remap[index]
+        positions[vertex_index * 3 + 0] = mesh.positions[offset + 0]
+        positions[vertex_index * 3 + 1] = mesh.positions[offset + 1]
+        positions[vertex_index * 3 + 2] = mesh.positions[offset + 2]
+        normals[vertex_index * 3 + 0] = mesh.normals[offset + 0]
+        normals[vertex_index * 3 + 1] = mesh.normals[offset + 1]
+        normals[vertex_index * 3 + 2] = mesh.normals[offset + 2]
+        uvs[vertex_index * 2 + 0] = mesh.uvs[offset + 0]
+        uvs[vertex_index * 2 + 1] = -mesh.uvs[offset + 1] + 1.0
+
+    geo.positions.extend(positions)
+    geo.normals.extend(normals)
+    geo.uvs.extend(uvs)
+    geo.indices.extend(remap[index] for index in indices)
+    return geo
+
+
+def geometries_are_equal(a: fbx.FbxGeometry, b: fbx.FbxGeometry) -> bool:
+    return a.positions == b.positions and a.normals == b.normals and a.uvs == b.uvs and a.indices == b.indices
+
+
+def bench_convert_mesh(payloads: list, repeat: int = 5):
+    print("convert_mesh_to_fbx_geometry: per-vertex reference vs array converter (best of " + str(repeat) + ")")
+    print("{0:<40} {1:>8} {2:>12} {3:>12} {4:>8}".format("mesh", "verts", "per-vertex,ms", "arrays,ms", "speedup"))
+    for name, payload in payloads:
+        mesh = rbmesh.parse_mesh(payload)
+        geo = rbmesh.convert_mesh_to_fbx_geometry(mesh, 0)
+        if not geometries_are_equal(geo, convert_mesh_per_vertex(mesh, 0)):
+            print(name + ": converted geometries are not equal!")
+            sys.exit(1)
+
+        t_ref = time_best(lambda: convert_mesh_per_vertex(mesh, 0), repeat)
+        t_arrays = time_best(lambda: rbmesh.convert_mesh_to_fbx_geometry(mesh, 0), repeat)
+        print("{0:<40} {1:>8} {2:>12.3f} {3:>12.3f} {4:>7.1f}x".format(
+            name, geo.get_number_of_vertices(), t_ref * 1000.0, t_arrays * 1000.0, t_ref / t_arrays))
+
+
+def append_geometry_per_element(doc: fbx.FbxDocument, geo: fbx.FbxGeometry):
+    # reference emitter, formats every vertex/triangle/normal/uv with its own str.format call
+    vertices_count = geo.get_number_of_vertices()
+    indices_count = len(geo.indices)
+    positions = geo.positions
+    normals = geo.normals
+    uvs = geo.uvs
+
+    doc._append_line("\t\tVertices: *" + str(vertices_count * 3) + " {")
+    doc._append("\t\t\ta: ")
+    for i in range(vertices_count):
+        if i > 0:
+            doc._append(",")
+        doc._append("{0},{1},{2}".format(positions[i * 3 + 0], positions[i * 3 + 1], positions[i * 3 + 2]))
+    doc._append_line("")
+    doc._append_line("\t\t} ")
+
+    doc._append_line("\t\tPolygonVertexIndex: *" + str(indices_count) + " {")
+    doc._append("\t\t\ta: ")
+    for i in range(0, indices_count, 3):
+        if i > 0:
+            doc._append(",")
+        doc._append("{0},{1},{2}".format(geo.indices[i + 0], geo.indices[i + 1], -geo.indices[i + 2] - 1))
+    doc._append_line("")
+    doc._append_line("\t\t} ")
+
+    doc._append_line("\t\t\tNormals: *" + str(indices_count * 3) + " {")
+    doc._append("\t\t\t\ta: ")
+    for i in range(0, indices_count, 3):
+        if i > 0:
+            doc._append(",")
+        n0 = geo.indices[i + 0] * 3
+        n1 = geo.indices[i + 1] * 3
+        n2 = geo.indices[i + 2] * 3
+        doc._append("{0},{1},{2},".format(normals[n0 + 0], normals[n0 + 1], normals[n0 + 2]))
+        doc._append("{0},{1},{2},".format(normals[n1 + 0], normals[n1 + 1], normals[n1 + 2]))
+        doc._append("{0},{1},{2}".format(normals[n2 + 0], normals[n2 + 1], normals[n2 + 2]))
+    doc._append_line("")
+    doc._append_line("\t\t\t}")
+
+    doc._append_line("\t\t\tUV: *" + str(vertices_count * 2) + " {")
+    doc._append("\t\t\t\ta: ")
+    for i in range(vertices_count):
+        if i > 0:
+            doc._append(",")
+        doc._append("{0},{1}".format(uvs[i * 2 + 0], uvs[i * 2 + 1]))
+    doc._append_line("")
+    doc._append_line("\t\t\t\t}")
+
+    doc._append_line("\t\t\tUVIndex: *" + str(indices_count) + " {")
+    doc._append("\t\t\t\ta: ")
+    for i in range(0, indices_count, 3):
+        if i > 0:
+            doc._append(",")
+        doc._append("{0},{1},{2}".format(geo.indices[i + 0], geo.indices[i + 1], geo.indices[i + 2]))
+    doc._append_line("")
+    doc._append_line("\t\t\t}")
+
+
+def emit_geometry(doc: fbx.FbxDocument, geo: fbx.FbxGeometry):
+    # forget already written geometries, otherwise the document would only reference the first copy
+    doc.geometries.clear()
+    doc.create_geometry(geo)
+
+
+def get_array_lines(text: str) -> list:
+    return [line.strip() for line in text.split("\n") if line.strip().startswith("a: ")]
+
+
+def bench_fbx_mesh(file_names: list, repeat: int = 5):
+    print("FbxDocument.create_mesh arrays: per-element reference vs bulk emitter (best of " + str(repeat) + ")")
+    print("{0:<40} {1:>8} {2:>12} {3:>12} {4:>8} {5:>12} {6:>8}".format(
+        "mesh", "verts", "per-elem,ms", "bulk,ms", "speedup", "bulk .9g,ms", "speedup"))
+    for file_name in file_names:
+        with open(file_name, 'rb') as mesh_file:
+            geo = rbmesh.convert_mesh_to_fbx_geometry(rbmesh.parse_mesh(mesh_file.read()), 0)
+
+        reference_doc = fbx.FbxDocument(file_name)
+        append_geometry_per_element(reference_doc, geo)
+        bulk_doc = fbx.FbxDocument(file_name)
+        bulk_doc.create_mesh("mesh", fbx.FbxTransform(), geo)
+        # the reference emitter only writes arrays without the material layer
+        if get_array_lines(''.join(reference_doc.text_chunks)) != get_array_lines(''.join(bulk_doc.text_chunks))[:5]:
+            print(file_name + ": emitted arrays are not equal!")
+            sys.exit(1)
+
+        t_ref = time_best(lambda: append_geometry_per_element(reference_doc, geo), repeat)
+        t_bulk = time_best(lambda: emit_geometry(bulk_doc, geo), repeat)
+        # 9 significant digits are enough to round-trip float32 mesh data
+        rounded_doc = fbx.FbxDocument(file_name, float_precision=9)
+        t_rounded = time_best(lambda: emit_geometry(rounded_doc, geo), repeat)
+        print("{0:<40} {1:>8} {2:>12.3f} {3:>12.3f} {4:>7.1f}x {5:>12.3f} {6:>7.1f}x".format(
+            file_name, geo.get_number_of_vertices(), t_ref * 1000.0, t_bulk * 1000.0, t_ref / t_bulk,
+            t_rounded * 1000.0, t_ref / t_rounded))
+
+
+def load_payloads(file_names: list) -> list:
+    payloads = []
+    for file_name in file_names:
+        with open(file_name, 'rb') as mesh_file:
+            payload = mesh_file.read()
+        # the reference decoder only understands binary meshes
+        if payload.startswith(b'version 1.'):
+            continue
+        payloads.append((file_name, payload))
+    return payloads
+
+
+def main():
+    if len(sys.argv) > 1:
+        payloads = load_payloads(sys.argv[1:])
+    else:
+        built_in = sorted(glob.glob('./built-in/*.mesh')) + sorted(glob.glob('./built-in/avatar/heads/*.mesh'))
+        payloads = load_payloads([os.path.normpath(file_name) for file_name in built_in])
+        for version in range(2, 8):
+            payloads.append(("synthetic v" + str(version) + ".00", make_binary_mesh(version, 20000, 3)))
+
+    bench_parse_mesh(payloads)
+    print("")
+    chunked_mesh = make_chunked_mesh(6, 100)
+    check_rejected_meshes([("synthetic v7.00 draco", make_chunked_mesh(7, 100, draco=True)),
+                           ("synthetic v6.00 truncated", chunked_mesh[:-10]),
+                           ("synthetic v6.00 no COREMESH", chunked_mesh[:13])])
+    print("")
+    bench_convert_mesh(payloads)
+    print("")
+    heads = sorted(glob.glob('./built-in/avatar/heads/*.mesh'))
+    bench_fbx_mesh([os.path.normpath(file_name) for file_name in heads])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,409 @@
+# The MIT License (MIT)
+#
+# 	Copyright (c) 2019 Sergey Makeev
+#
+# 	Permission is hereby granted, free of charge, to any person obtaining a copy
+# 	of this software and associated documentation files (the "Software"), to deal
+# 	in the Software without restriction, including without limitation the rights
+# 	to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# 	copies of the Software, and to permit persons to whom the Software is
+# 	furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in
+# 	all copies or substantial portions of the Software.
+#
+# 	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# 	THE SOFTWARE.
+
+#
+# End-to-end export benchmark
+#
+# usage: python benchmark_export.py [--vertices N] [--avatars N] [--accessories N] [--repeat N] [--workers N]
+#                                   [--output results.json] [--baseline baseline.json] [--threshold percent]
+#
+# Synthetic v1.00-v7.00 meshes and R15 model descriptions (Motor6Ds, Attachments, Accessories) are generated
+# deterministically and served by a local asset server, so no network or Roblox Studio is needed.
+# Every stage reports the best time of 'repeat' runs, peak traced memory of one extra run and output size.
+#
+import io
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import platform
+import threading
+import tracemalloc
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import fbx
+import fbxbin
+import rbmesh
+import benchmark
+import assetcache
+import fetchpolicy
+import FbxExporterServer as server
+
+MESH_VERSIONS = ('1.00', '1.01', '2.00', '3.00', '4.00', '5.00', '6.00', '7.00')
+
+# R15 body parts: name, parent part, position
+R15_PARTS = (
+    ('LowerTorso', 'HumanoidRootPart', (0, 2.8, 0)),
+    ('UpperTorso', 'LowerTorso', (0, 3.6, 0)),
+    ('Head', 'UpperTorso', (0, 4.9, 0)),
+    ('LeftUpperArm', 'UpperTorso', (-1.3, 4.0, 0)),
+    ('LeftLowerArm', 'LeftUpperArm', (-1.3, 3.3, 0)),
+    ('LeftHand', 'LeftLowerArm', (-1.3, 2.8, 0)),
+    ('RightUpperArm', 'UpperTorso', (1.3, 4.0, 0)),
+    ('RightLowerArm', 'RightUpperArm', (1.3, 3.3, 0)),
+    ('RightHand', 'RightLowerArm', (1.3, 2.8, 0)),
+    ('LeftUpperLeg', 'LowerTorso', (-0.5, 2.0, 0)),
+    ('LeftLowerLeg', 'LeftUpperLeg', (-0.5, 1.1, 0)),
+    ('LeftFoot', 'LeftLowerLeg', (-0.5, 0.3, 0)),
+    ('RightUpperLeg', 'LowerTorso', (0.5, 2.0, 0)),
+    ('RightLowerLeg', 'RightUpperLeg', (0.5, 1.1, 0)),
+    ('RightFoot', 'RightLowerLeg', (0.5, 0.3, 0)),
+)
+
+# Motor6D name of a part (the part is Part1 of the joint)
+R15_JOINTS = {
+    'LowerTorso': 'Root', 'UpperTorso': 'Waist', 'Head': 'Neck',
+    'LeftUpperArm': 'LeftShoulder', 'LeftLowerArm': 'LeftElbow', 'LeftHand': 'LeftWrist',
+    'RightUpperArm': 'RightShoulder', 'RightLowerArm': 'RightElbow', 'RightHand': 'RightWrist',
+    'LeftUpperLeg': 'LeftHip', 'LeftLowerLeg': 'LeftKnee', 'LeftFoot': 'LeftAnkle',
+    'RightUpperLeg': 'RightHip', 'RightLowerLeg': 'RightKnee', 'RightFoot': 'RightAnkle',
+}
+
+# non-rig attachments, accessories are attached to them
+R15_ATTACHMENTS = (
+    ('Head', 'HatAttachment', (0, 0.6, 0)),
+    ('Head', 'FaceFrontAttachment', (0, 0, -0.6)),
+    ('UpperTorso', 'NeckAttachment', (0, 0.8, 0)),
+    ('UpperTorso', 'BodyBackAttachment', (0, 0, 0.5)),
+    ('LowerTorso', 'WaistCenterAttachment', (0, -0.2, 0)),
+    ('LeftHand', 'LeftGripAttachment', (0, -0.15, 0)),
+    ('RightHand', 'RightGripAttachment', (0, -0.15, 0)),
+)
+
+
+def make_cframe(x: float = 0, y: float = 0, z: float = 0) -> dict:
+    return {"tx": x, "ty": y, "tz": z,
+            "r00": 1, "r01": 0, "r02": 0, "r10": 0, "r11": 1, "r12": 0, "r20": 0, "r21": 0, "r22": 1}
+
+
+def make_mesh(version: str, num_vertices: int) -> bytes:
+    if version.startswith('1.'):
+        return benchmark.make_text_mesh(version, num_vertices)
+    return benchmark.make_binary_mesh(int(version[0]), num_vertices, 2 if version >= '3.00' else 1)
+
+
+def make_png(seed: int, size: int = 4096) -> bytes:
+    # only the signature matters to the exporter
+    body = hashlib.sha256(str(seed).encode('ascii')).digest() * (size // 32)
+    return b'\x89PNG\r\n\x1a\n' + body
+
+
+def make_r15_description(name: str, mesh_ids: list, texture_id: str, num_accessories: int) -> dict:
+    # mesh_ids - one asset id per body part followed by one per accessory
+    desc = dict()
+    ids = dict()
+
+    def add(obj: dict) -> str:
+        key = str(len(desc) + 1)
+        desc[key] = obj
+        return key
+
+    model = add({"Class": "Model", "Name": name, "Parent": "-1"})
+    ids['HumanoidRootPart'] = add({"Class": "Part", "Name": "HumanoidRootPart", "Parent": model,
+                                   "CFrame": make_cframe(0, 2.8, 0), "SizeX": 2, "SizeY": 2, "SizeZ": 1})
+    desc[model]["PrimaryPart"] = ids['HumanoidRootPart']
+
+    for index, (part_name, _, position) in enumerate(R15_PARTS):
+        ids[part_name] = add({"Class": "MeshPart", "Name": part_name, "Parent": model,
+                              "CFrame": make_cframe(*position), "MeshType": "File",
+                              "MeshId": "rbxassetid://" + mesh_ids[index],
+                              "TextureId": "rbxassetid://" + texture_id,
+                              "SizeX": 1, "SizeY": 1, "SizeZ": 1,
+                              "OffsetX": 0, "OffsetY": 0, "OffsetZ": 0,
+                              "ScaleX": 1, "ScaleY": 1.1 if index % 2 else 1, "ScaleZ": 1})
+
+    for part_name, parent_name, position in R15_PARTS:
+        joint_name = R15_JOINTS[part_name]
+        parent_position = dict((part[0], part[2]) for part in R15_PARTS).get(parent_name, (0, 2.8, 0))
+        # joint is half way between parts
+        offset = [(a - b) * 0.5 for a, b in zip(position, parent_position)]
+        add({"Class": "Attachment", "Name": joint_name + "RigAttachment", "Parent": ids[parent_name],
+             "CFrame": make_cframe(*offset)})
+        add({"Class": "Attachment", "Name": joint_name + "RigAttachment", "Parent": ids[part_name],
+             "CFrame": make_cframe(*[-value for value in offset])})
+        add({"Class": "Motor6D", "Name": joint_name, "Parent": ids[part_name],
+             "Part0": ids[parent_name], "Part1": ids[part_name],
+             "C0": make_cframe(*offset), "C1": make_cframe(*[-value for value in offset]), "Transform": make_cframe()})
+
+    for part_name, attachment_name, position in R15_ATTACHMENTS:
+        add({"Class": "Attachment", "Name": attachment_name, "Parent": ids[part_name],
+             "CFrame": make_cframe(*position)})
+
+    for index in range(num_accessories):
+        part_name, attachment_name, position = R15_ATTACHMENTS[index % len(R15_ATTACHMENTS)]
+        accessory = add({"Class": "Accessory", "Name": "Item" + str(index) + "Accessory", "Parent": model,
+                         "AttachPoint": make_cframe(0, 0.1, 0)})
+        handle = add({"Class": "MeshPart", "Name": "Handle", "Parent": accessory,
+                      "CFrame": make_cframe(position[0], position[1] + 4.9, position[2]), "MeshType": "File",
+                      "MeshId": "rbxassetid://" + mesh_ids[len(R15_PARTS) + index],
+                      "TextureId": "rbxassetid://" + texture_id,
+                      "SizeX": 1, "SizeY": 1, "SizeZ": 1, "OffsetX": 0, "OffsetY": 0, "OffsetZ": 0,
+                      "ScaleX": 1, "ScaleY": 1, "ScaleZ": 1})
+        add({"Class": "Attachment", "Name": attachment_name, "Parent": handle, "CFrame": make_cframe(0, -0.1, 0)})
+        add({"Class": "WeldConstraint", "Name": "AccessoryWeld", "Parent": handle,
+             "Part0": handle, "Part1": ids[part_name]})
+
+    return desc
+
+
+def make_avatars(num_avatars: int, num_vertices: int, num_accessories: int):
+    # returns (model descriptions, asset id -> payload), every mesh has a unique payload
+    assets = dict()
+    descs = list()
+    for avatar_index in range(num_avatars):
+        mesh_ids = list()
+        for part_index in range(len(R15_PARTS) + num_accessories):
+            asset_id = str(1000000 + avatar_index * 1000 + part_index)
+            version = MESH_VERSIONS[(avatar_index + part_index) % len(MESH_VERSIONS)]
+            assets[asset_id] = make_mesh(version, num_vertices + avatar_index * 100 + part_index * 3)
+            mesh_ids.append(asset_id)
+        texture_id = str(2000000 + avatar_index)
+        assets[texture_id] = make_png(avatar_index)
+        descs.append(make_r15_description("Benchmark" + str(avatar_index), mesh_ids, texture_id, num_accessories))
+    return descs, assets
+
+
+class AssetServer:
+    # local asset delivery stub: GET /asset/?id=<id>, gzip and ETag/If-None-Match are supported
+    def __init__(self, assets: dict):
+        self.requests = 0
+        self.sent_bytes = 0
+        stub = self
+        compressed = dict((asset_id, gzip.compress(payload, 1)) for asset_id, payload in assets.items())
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            # noinspection PyPep8Naming
+            def do_GET(self):
+                stub.requests += 1
+                asset_id = self.path.rpartition('=')[2]
+                body = compressed.get(asset_id, None)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = '"' + asset_id + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Encoding', 'gzip')
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                stub.sent_bytes += len(body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = 'http://127.0.0.1:{0}/asset/?id='.format(self.httpd.server_address[1])
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def measure(func, repeat: int) -> dict:
+    # best time of 'repeat' runs, peak traced memory of one more run
+    result = None
+    seconds = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    stage = {"seconds": seconds, "peak_bytes": peak_bytes}
+    if isinstance(result, (bytes, str)):
+        stage["output_bytes"] = len(result)
+    elif isinstance(result, int):
+        stage["output_bytes"] = result
+    return stage
+
+
+def build_document(output_format: str, geos: list):
+    if output_format == 'binary':
+        doc = fbxbin.FbxBinaryDocument("benchmark.fbx")
+    else:
+        doc = fbx.FbxDocument("benchmark.fbx")
+    for index, geo in enumerate(geos):
+        doc.create_mesh("Mesh" + str(index), fbx.FbxTransform(), geo)
+    return doc.finalize()
+
+
+def export_avatars(descs: list, output_format: str, cache_dir: str, force: bool = True) -> int:
+    # exports all avatars, returns the total size of the written FBX files
+    # force=False - unchanged avatars are skipped (manifest check only)
+    server.asset_cache = assetcache.AssetCache(cache_dir, 1 << 40)
+    server.mesh_cache.clear()
+    total_size = 0
+    for desc in descs:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = server.export_roblox_model(json.loads(json.dumps(desc)), output_format, force)
+        file_name = result[len("Saved file:"):]
+        total_size += os.path.getsize(file_name)
+    return total_size
+
+
+def run(args) -> dict:
+    stages = dict()
+
+    # mesh decoding, per mesh version
+    for version in MESH_VERSIONS:
+        payload = make_mesh(version, args.vertices)
+        stages["parse_mesh." + version] = measure(lambda: rbmesh.parse_mesh(payload), args.repeat)
+
+    # transform and conversion to FBX geometry
+    mesh = rbmesh.parse_mesh(make_mesh('4.00', args.vertices))
+    cframe = server.cframe_rotation_y(3.14159)
+
+    def convert():
+        mesh_copy = mesh.copy()
+        server.mesh_transform_vertices(mesh_copy, cframe, 0.1, 0.2, 0.3, 1.0, 1.1, 1.0)
+        return rbmesh.convert_mesh_to_fbx_geometry(mesh_copy, 0)
+    stages["transform_convert"] = measure(convert, args.repeat)
+
+    # FBX formatting of a full avatar worth of geometry
+    geos = [convert() for _ in range(len(R15_PARTS) + args.accessories)]
+    for output_format in server.FBX_FORMATS:
+        stages["fbx_finalize." + output_format] = measure(lambda: build_document(output_format, geos), args.repeat)
+
+    # end-to-end exports through the local asset server
+    descs, assets = make_avatars(args.avatars, args.vertices, args.accessories)
+    asset_server = AssetServer(assets)
+    server.asset_fetch_endpoint = asset_server.url
+    server.fetch_policy = fetchpolicy.FetchPolicy(max_retries=0)
+    if args.workers > 0:
+        server.mesh_workers = server.meshworker.create_pool(args.workers, 256 * 1024 * 1024 // args.workers)
+    server.warm_built_in_assets()
+
+    # asset caches and exported files, the user's ./Avatars folder is never touched
+    temp_dir = tempfile.mkdtemp(prefix='benchmark_export')
+    server.output_folder = os.path.join(temp_dir, 'Avatars') + os.sep
+    try:
+        # every cold run gets a new empty cache folder
+        counter = iter(range(1 << 30))
+        for output_format in server.FBX_FORMATS:
+            # empty asset cache, every asset is downloaded
+            stages["export.cold." + output_format] = measure(
+                lambda: export_avatars(descs, output_format, os.path.join(temp_dir, str(next(counter)))),
+                args.repeat)
+            # populated asset cache, no requests
+            warm_cache_dir = os.path.join(temp_dir, 'warm')
+            export_avatars(descs, output_format, warm_cache_dir)
+            stages["export.warm." + output_format] = measure(
+                lambda: export_avatars(descs, output_format, warm_cache_dir), args.repeat)
+            # up to date manifests, nothing is fetched, parsed or written
+            stages["export.unchanged." + output_format] = measure(
+                lambda: export_avatars(descs, output_format, warm_cache_dir, False), args.repeat)
+    finally:
+        asset_server.close()
+        if server.mesh_workers is not None:
+            server.mesh_workers.shutdown()
+            server.mesh_workers = None
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return {"config": {"vertices": args.vertices, "avatars": args.avatars, "accessories": args.accessories,
+                       "repeat": args.repeat, "workers": args.workers,
+                       "meshes_per_avatar": len(R15_PARTS) + args.accessories},
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "asset_requests": asset_server.requests,
+            "stages": stages}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    # prints current vs baseline times, returns False if any stage is slower than the threshold allows
+    print("")
+    print("{0:<28} {1:>12} {2:>12} {3:>8}".format("stage", "baseline,ms", "current,ms", "ratio"))
+    ok = True
+    for name, stage in results["stages"].items():
+        base_stage = baseline.get("stages", {}).get(name, None)
+        if base_stage is None:
+            print("{0:<28} {1:>12} {2:>12.3f}".format(name, "-", stage["seconds"] * 1000.0))
+            continue
+        ratio = stage["seconds"] / base_stage["seconds"] if base_stage["seconds"] > 0 else 1.0
+        regression = ratio > 1.0 + threshold / 100.0
+        if regression:
+            ok = False
+        print("{0:<28} {1:>12.3f} {2:>12.3f} {3:>7.2f}x{4}".format(
+            name, base_stage["seconds"] * 1000.0, stage["seconds"] * 1000.0, ratio,
+            "  REGRESSION" if regression else ""))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end export benchmark on synthetic avatars')
+    parser.add_argument('--vertices', type=int, default=5000, help='vertices per mesh (default: %(default)s)')
+    parser.add_argument('--avatars', type=int, default=2, help='number of exported avatars (default: %(default)s)')
+    parser.add_argument('--accessories', type=int, default=3, help='accessories per avatar (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage, best is reported (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='mesh worker processes, 0 - in-process (default: %(default)s)')
+    parser.add_argument('--output', default=None, help='write results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='compare with results stored by a previous run')
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help='max allowed slowdown against the baseline in percent (default: %(default)s)')
+    args = parser.parse_args()
+
+    results = run(args)
+
+    print("{0:<28} {1:>12} {2:>12} {3:>12}".format("stage", "time,ms", "peak,KB", "output,KB"))
+    for name, stage in results["stages"].items():
+        print("{0:<28} {1:>12.3f} {2:>12.1f} {3:>12}".format(
+            name, stage["seconds"] * 1000.0, stage["peak_bytes"] / 1024.0,
+            "{0:.1f}".format(stage["output_bytes"] / 1024.0) if "output_bytes" in stage else "-"))
+
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+        if not compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
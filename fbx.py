@@ -20,6 +20,7 @@
 # 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # 	THE SOFTWARE.
 import uuid
+import array
 import datetime
 
 
@@ -50,24 +51,53 @@ def fbx_generate_id():
     return str(uid)[:13]
 
 
-class FbxVertex:
+class FbxGeometry:
     def __init__(self):
-        self.x = 0
-        self.y = 0
-        self.z = 0
+        # per vertex: positions (x, y, z), normals (nx, ny, nz), uvs (u, v)
+        self.positions = array.array('d')
+        self.normals = array.array('d')
+        self.uvs = array.array('d')
+        # triangle list
+        self.indices = array.array('i')
 
-        self.nx = 0
-        self.ny = 0
-        self.nz = 0
+    def get_number_of_vertices(self) -> int:
+        return len(self.positions) // 3
 
-        self.u = 0
-        self.v = 0
+    def to_buffers(self) -> tuple:
+        # compact form to pass geometry between processes, see geometry_from_buffers()
+        return self.positions.tobytes(), self.normals.tobytes(), self.uvs.tobytes(), self.indices.tobytes()
 
 
-class FbxGeometry:
-    def __init__(self):
-        self.vertices = []
-        self.indices = []
+def geometry_from_buffers(buffers: tuple) -> FbxGeometry:
+    geo = FbxGeometry()
+    positions, normals, uvs, indices = buffers
+    geo.positions.frombytes(positions)
+    geo.normals.frombytes(normals)
+    geo.uvs.frombytes(uvs)
+    geo.indices.frombytes(indices)
+    return geo
+
+
+def gather_xyz(values: array.array, indices) -> array.array:
+    # values[index] for every index of xyz triplets
+    res = array.array('d', bytes(len(indices) * 3 * 8))
+    for component in range(3):
+        component_values = values[component::3]
+        res[component::3] = array.array('d', [component_values[index] for index in indices])
+    return res
+
+
+def get_geometry_arrays(geo: FbxGeometry):
+    # flat arrays as they are stored in FBX: positions, polygon vertex indices (the last index of every
+    # polygon is stored as -index - 1), per polygon vertex normals and UVs
+    indices = geo.indices
+
+    polygon_indices = array.array('i', indices)
+    polygon_indices[2::3] = array.array('i', [-index - 1 for index in indices[2::3]])
+
+    normals = gather_xyz(geo.normals, indices)
+
+    return geo.positions, polygon_indices, normals, geo.uvs
 
 
 class FbxTransform:
@@ -122,11 +152,22 @@ class FbxColor4:
 
 
 class FbxDocument:
-    def __init__(self, name: str):
+    # stream - optional writable text stream, objects are written to it as they are created
+    # and finalize() only flushes connections, otherwise the document is accumulated in memory
+    # float_precision - number of significant digits for geometry arrays, None - shortest exact repr
+    def __init__(self, name: str, stream=None, float_precision: int = None):
         self.scene_objects = dict()
+        self.float_precision = float_precision
         self.text_chunks = []
+        self.stream = stream
+        if stream is not None:
+            self._write = stream.write
+        else:
+            self._write = self.text_chunks.append
         self.connections = []
         self.named_connections = []
+        # id(geometry) -> (geometry, geometry uid), keeps geometry objects alive so ids are not reused
+        self.geometries = dict()
         self._create_header(name)
         self._begin_objects()
 
@@ -145,11 +186,16 @@ class FbxDocument:
         return current_name.replace("-", "")
 
     def _append_line(self, txt: str):
-        self.text_chunks.append(txt)
-        self.text_chunks.append("\n")
+        self._write(txt)
+        self._write("\n")
 
     def _append(self, txt: str):
-        self.text_chunks.append(txt)
+        self._write(txt)
+
+    def _format_floats(self, values) -> str:
+        if self.float_precision is None:
+            return ','.join(map(repr, values))
+        return ','.join(map(('{:.' + str(self.float_precision) + 'g}').format, values))
 
     def _create_header(self, name: str):
         name = get_filename_without_ext(name)
@@ -580,34 +626,28 @@ class FbxDocument:
             return
         self.connections.append((object_id, layer_id))
 
-    def create_mesh(self, mesh_name: str, t: FbxTransform, geo: FbxGeometry, material_id: int = 0, parent_id: int = 0):
-        mesh_name = self._get_unique_name(mesh_name)
+    # Writes geometry once and returns its handle, meshes created with the same FbxGeometry object
+    # (or the handle) are instances of a single Geometry
+    def create_geometry(self, geo: FbxGeometry) -> str:
+        entry = self.geometries.get(id(geo), None)
+        if entry is not None:
+            return entry[1]
+
         geom_id = fbx_generate_id()
         self._append_line("\tGeometry: " + geom_id + ", \"Geometry::\", \"Mesh\" {")
 
-        vertices_count = len(geo.vertices)
+        vertices_count = geo.get_number_of_vertices()
         indices_count = len(geo.indices)
+        positions, polygon_indices, normals, uvs = get_geometry_arrays(geo)
 
         # vertices
         self._append_line("\t\tVertices: *" + str(vertices_count * 3) + " {")
-        self._append("\t\t\ta: ")
-        for i, vertex in enumerate(geo.vertices):
-            if i > 0:
-                self._append(",")
-            self._append("{0},{1},{2}".format(vertex.x, vertex.y, vertex.z))
-
-        self._append_line("")
+        self._append_line("\t\t\ta: " + self._format_floats(positions))
         self._append_line("\t\t} ")
 
         # triangles
         self._append_line("\t\tPolygonVertexIndex: *" + str(indices_count) + " {")
-        self._append("\t\t\ta: ")
-
-        for i in range(0, indices_count, 3):
-            if i > 0:
-                self._append(",")
-            self._append("{0},{1},{2}".format(geo.indices[i + 0], geo.indices[i + 1], -geo.indices[i + 2] - 1))
-        self._append_line("")
+        self._append_line("\t\t\ta: " + ','.join(map(str, polygon_indices)))
         self._append_line("\t\t} ")
 
         # vertex normals
@@ -617,21 +657,8 @@ class FbxDocument:
         self._append_line("\t\t\tName: \"\"")
         self._append_line("\t\t\tMappingInformationType: \"ByPolygonVertex\"")
         self._append_line("\t\t\tReferenceInformationType: \"Direct\"")
-
         self._append_line("\t\t\tNormals: *" + str(indices_count * 3) + " {")
-        self._append("\t\t\t\ta: ")
-
-        for i in range(0, indices_count, 3):
-            if i > 0:
-                self._append(",")
-            v0 = geo.vertices[geo.indices[i + 0]]
-            v1 = geo.vertices[geo.indices[i + 1]]
-            v2 = geo.vertices[geo.indices[i + 2]]
-            self._append("{0},{1},{2},".format(v0.nx, v0.ny, v0.nz))
-            self._append("{0},{1},{2},".format(v1.nx, v1.ny, v1.nz))
-            self._append("{0},{1},{2},".format(v2.nx, v2.ny, v2.nz))
-
-        self._append_line("")
+        self._append_line("\t\t\t\ta: " + self._format_floats(normals))
         self._append_line("\t\t\t}")
         self._append_line("\t\t}")
 
@@ -642,27 +669,12 @@ class FbxDocument:
         self._append_line("\t\t\tMappingInformationType: \"ByPolygonVertex\"")
         self._append_line("\t\t\tReferenceInformationType: \"IndexToDirect\"")
         self._append_line("\t\t\tUV: *" + str(vertices_count * 2) + " {")
-        self._append("\t\t\t\ta: ")
-
-        for i, vertex in enumerate(geo.vertices):
-            if i > 0:
-                self._append(",")
-            self._append("{0},{1}".format(vertex.u, vertex.v))
-
-        self._append_line("")
+        self._append_line("\t\t\t\ta: " + self._format_floats(uvs))
         self._append_line("\t\t\t\t}")
 
         # UV indices
         self._append_line("\t\t\tUVIndex: *" + str(indices_count) + " {")
-        self._append("\t\t\t\ta: ")
-
-        for i in range(0, indices_count, 3):
-            if i > 0:
-                self._append(",")
-
-            self._append("{0},{1},{2}".format(geo.indices[i + 0], geo.indices[i + 1], geo.indices[i + 2]))
-
-        self._append_line("")
+        self._append_line("\t\t\t\ta: " + ','.join(map(str, geo.indices)))
         self._append_line("\t\t\t}")
         self._append_line("\t\t}")
 
@@ -693,6 +705,16 @@ class FbxDocument:
         self._append_line("\t\t}")
 
         self._append_line("\t}")
+        self.geometries[id(geo)] = (geo, geom_id)
+        return geom_id
+
+    def create_mesh(self, mesh_name: str, t: FbxTransform, geo, material_id: int = 0, parent_id: int = 0):
+        mesh_name = self._get_unique_name(mesh_name)
+        # geo - FbxGeometry or a handle returned by create_geometry()
+        if isinstance(geo, FbxGeometry):
+            geom_id = self.create_geometry(geo)
+        else:
+            geom_id = geo
 
         # model (transform)
         uid = fbx_generate_id()
@@ -734,7 +756,7 @@ class FbxDocument:
 
         return uid
 
-    def finalize(self) -> str:
+    def finalize(self) -> str or None:
         self._end_objects()
         self._append_line("; Object connections")
         self._append_line(";------------------------------------------------------------------")
@@ -748,4 +770,6 @@ class FbxDocument:
             self._append_line("\tC: \"OP\",{0},{1}, \"{2}\"".format(node_id, parent_id, name))
 
         self._append_line("}")
+        if self.stream is not None:
+            return None
         return ''.join(self.text_chunks)
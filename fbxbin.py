@@ -0,0 +1,700 @@
+# The MIT License (MIT)
+#
+# 	Copyright (c) 2019 Sergey Makeev
+#
+# 	Permission is hereby granted, free of charge, to any person obtaining a copy
+# 	of this software and associated documentation files (the "Software"), to deal
+# 	in the Software without restriction, including without limitation the rights
+# 	to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# 	copies of the Software, and to permit persons to whom the Software is
+# 	furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in
+# 	all copies or substantial portions of the Software.
+#
+# 	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# 	THE SOFTWARE.
+import io
+import sys
+import zlib
+import array
+import struct
+import datetime
+import fbx
+
+#
+# Binary FBX 7.4/7.5 writer, same API as fbx.FbxDocument
+#
+# Node record:
+#   EndOffset, NumProperties, PropertyListLen (uint32 for 7.4, uint64 for 7.5)
+#   NameLen (uint8), Name
+#   Properties (type code + value)
+#   Nested nodes, followed by a NULL record
+#
+# EndOffset is an absolute file offset, so nodes are written to an in-memory buffer and the offset
+# is patched when the node is closed. In streaming mode the buffer is flushed to the output stream
+# between top level objects, only the few nodes that stay open across a flush (Objects, Connections, ...)
+# are patched in the stream itself, so the stream has to be seekable.
+#
+# FileId / CreationTime / footer magic are the fixed values used by Blender's FBX exporter,
+# FBX SDK validates the footer against the file id and creation time.
+#
+
+_HEAD_MAGIC = b'Kaydara FBX Binary  \x00\x1a\x00'
+_FILE_ID = b'\x28\xb3\x2a\xeb\xb6\x24\xcc\xc2\xbf\xc8\xb0\x2a\xa9\x2b\xfc\xf1'
+_TIME_ID = '1970-01-01 10:00:00:000'
+_FOOT_ID = b'\xfa\xbc\xab\x09\xd0\xc8\xd4\x66\xb1\x76\xfb\x83\x1c\xf7\x26\x7e'
+_FOOT_MAGIC = b'\xf8\x5a\x8c\x6a\xde\xf5\xd9\x7e\xec\xe9\x0c\xe3\x75\x8f\x29\x0b'
+
+# arrays smaller than this are stored uncompressed
+_COMPRESSION_THRESHOLD = 128
+# streaming mode: min size of the buffer flushed to the output stream
+_FLUSH_THRESHOLD = 64 * 1024
+
+# Properties70 value types
+_P_INT_TYPES = ('int', 'enum', 'bool', 'Visibility Inheritance')
+_P_LONG_TYPES = ('KTime',)
+_P_STRING_TYPES = ('KString', 'DateTime')
+
+_GLOBAL_SETTINGS = (
+    ('UpAxis', 'int', 'Integer', '', 1),
+    ('UpAxisSign', 'int', 'Integer', '', 1),
+    ('FrontAxis', 'int', 'Integer', '', 2),
+    ('FrontAxisSign', 'int', 'Integer', '', 1),
+    ('CoordAxis', 'int', 'Integer', '', 0),
+    ('CoordAxisSign', 'int', 'Integer', '', 1),
+    ('OriginalUpAxis', 'int', 'Integer', '', -1),
+    ('OriginalUpAxisSign', 'int', 'Integer', '', 1),
+    ('UnitScaleFactor', 'double', 'Number', '', 1),
+    ('OriginalUnitScaleFactor', 'double', 'Number', '', 100),
+    ('AmbientColor', 'ColorRGB', 'Color', '', 0, 0, 0),
+    ('DefaultCamera', 'KString', '', '', 'Producer Perspective'),
+    ('TimeMode', 'enum', '', '', 11),
+    ('TimeSpanStart', 'KTime', 'Time', '', 0),
+    ('TimeSpanStop', 'KTime', 'Time', '', 479181389250),
+    ('CustomFrameRate', 'double', 'Number', '', -1),
+)
+
+_MODEL_TEMPLATE = (
+    ('QuaternionInterpolate', 'enum', '', '', 0),
+    ('RotationOffset', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('RotationPivot', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('ScalingOffset', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('ScalingPivot', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('TranslationActive', 'bool', '', '', 0),
+    ('TranslationMin', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('TranslationMax', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('TranslationMinX', 'bool', '', '', 0),
+    ('TranslationMinY', 'bool', '', '', 0),
+    ('TranslationMinZ', 'bool', '', '', 0),
+    ('TranslationMaxX', 'bool', '', '', 0),
+    ('TranslationMaxY', 'bool', '', '', 0),
+    ('TranslationMaxZ', 'bool', '', '', 0),
+    ('RotationOrder', 'enum', '', '', 0),
+    ('RotationSpaceForLimitOnly', 'bool', '', '', 0),
+    ('RotationStiffnessX', 'double', 'Number', '', 0),
+    ('RotationStiffnessY', 'double', 'Number', '', 0),
+    ('RotationStiffnessZ', 'double', 'Number', '', 0),
+    ('AxisLen', 'double', 'Number', '', 10),
+    ('PreRotation', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('PostRotation', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('RotationActive', 'bool', '', '', 0),
+    ('RotationMin', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('RotationMax', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('RotationMinX', 'bool', '', '', 0),
+    ('RotationMinY', 'bool', '', '', 0),
+    ('RotationMinZ', 'bool', '', '', 0),
+    ('RotationMaxX', 'bool', '', '', 0),
+    ('RotationMaxY', 'bool', '', '', 0),
+    ('RotationMaxZ', 'bool', '', '', 0),
+    ('InheritType', 'enum', '', '', 0),
+    ('ScalingActive', 'bool', '', '', 0),
+    ('ScalingMin', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('ScalingMax', 'Vector3D', 'Vector', '', 1, 1, 1),
+    ('ScalingMinX', 'bool', '', '', 0),
+    ('ScalingMinY', 'bool', '', '', 0),
+    ('ScalingMinZ', 'bool', '', '', 0),
+    ('ScalingMaxX', 'bool', '', '', 0),
+    ('ScalingMaxY', 'bool', '', '', 0),
+    ('ScalingMaxZ', 'bool', '', '', 0),
+    ('GeometricTranslation', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('GeometricRotation', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('GeometricScaling', 'Vector3D', 'Vector', '', 1, 1, 1),
+    ('MinDampRangeX', 'double', 'Number', '', 0),
+    ('MinDampRangeY', 'double', 'Number', '', 0),
+    ('MinDampRangeZ', 'double', 'Number', '', 0),
+    ('MaxDampRangeX', 'double', 'Number', '', 0),
+    ('MaxDampRangeY', 'double', 'Number', '', 0),
+    ('MaxDampRangeZ', 'double', 'Number', '', 0),
+    ('MinDampStrengthX', 'double', 'Number', '', 0),
+    ('MinDampStrengthY', 'double', 'Number', '', 0),
+    ('MinDampStrengthZ', 'double', 'Number', '', 0),
+    ('MaxDampStrengthX', 'double', 'Number', '', 0),
+    ('MaxDampStrengthY', 'double', 'Number', '', 0),
+    ('MaxDampStrengthZ', 'double', 'Number', '', 0),
+    ('PreferedAngleX', 'double', 'Number', '', 0),
+    ('PreferedAngleY', 'double', 'Number', '', 0),
+    ('PreferedAngleZ', 'double', 'Number', '', 0),
+    ('LookAtProperty', 'object', '', ''),
+    ('UpVectorProperty', 'object', '', ''),
+    ('Show', 'bool', '', '', 1),
+    ('NegativePercentShapeSupport', 'bool', '', '', 1),
+    ('DefaultAttributeIndex', 'int', 'Integer', '', -1),
+    ('Freeze', 'bool', '', '', 0),
+    ('LODBox', 'bool', '', '', 0),
+    ('Lcl Translation', 'Lcl Translation', '', 'A', 0, 0, 0),
+    ('Lcl Rotation', 'Lcl Rotation', '', 'A', 0, 0, 0),
+    ('Lcl Scaling', 'Lcl Scaling', '', 'A', 1, 1, 1),
+    ('Visibility', 'Visibility', '', 'A', 1),
+    ('Visibility Inheritance', 'Visibility Inheritance', '', '', 1),
+)
+
+_DISPLAY_LAYER_TEMPLATE = (
+    ('Color', 'ColorRGB', 'Color', '', 0.8, 0.8, 0.8),
+    ('Show', 'bool', '', '', 1),
+    ('Freeze', 'bool', '', '', 0),
+    ('LODBox', 'bool', '', '', 0),
+)
+
+_NULL_TEMPLATE = (
+    ('Color', 'ColorRGB', 'Color', '', 0.8, 0.8, 0.8),
+    ('Size', 'double', 'Number', '', 100),
+    ('Look', 'enum', '', '', 1),
+)
+
+_MESH_TEMPLATE = (
+    ('Color', 'ColorRGB', 'Color', '', 0.8, 0.8, 0.8),
+    ('BBoxMin', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('BBoxMax', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('Primary Visibility', 'bool', '', '', 1),
+    ('Casts Shadows', 'bool', '', '', 1),
+    ('Receive Shadows', 'bool', '', '', 1),
+)
+
+_LAMBERT_TEMPLATE = (
+    ('ShadingModel', 'KString', '', '', 'Lambert'),
+    ('MultiLayer', 'bool', '', '', 0),
+    ('EmissiveColor', 'Color', '', 'A', 0, 0, 0),
+    ('EmissiveFactor', 'Number', '', 'A', 1),
+    ('AmbientColor', 'Color', '', 'A', 0.2, 0.2, 0.2),
+    ('AmbientFactor', 'Number', '', 'A', 1),
+    ('DiffuseColor', 'Color', '', 'A', 0.8, 0.8, 0.8),
+    ('DiffuseFactor', 'Number', '', 'A', 1),
+    ('Bump', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('NormalMap', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('BumpFactor', 'double', 'Number', '', 1),
+    ('TransparentColor', 'Color', '', 'A', 0, 0, 0),
+    ('TransparencyFactor', 'Number', '', 'A', 0),
+    ('DisplacementColor', 'ColorRGB', 'Color', '', 0, 0, 0),
+    ('DisplacementFactor', 'double', 'Number', '', 1),
+    ('VectorDisplacementColor', 'ColorRGB', 'Color', '', 0, 0, 0),
+    ('VectorDisplacementFactor', 'double', 'Number', '', 1),
+)
+
+_FILE_TEXTURE_TEMPLATE = (
+    ('TextureTypeUse', 'enum', '', '', 0),
+    ('Texture alpha', 'Number', '', 'A', 1),
+    ('CurrentMappingType', 'enum', '', '', 0),
+    ('WrapModeU', 'enum', '', '', 0),
+    ('WrapModeV', 'enum', '', '', 0),
+    ('UVSwap', 'bool', '', '', 0),
+    ('PremultiplyAlpha', 'bool', '', '', 1),
+    ('Translation', 'Vector', '', 'A', 0, 0, 0),
+    ('Rotation', 'Vector', '', 'A', 0, 0, 0),
+    ('Scaling', 'Vector', '', 'A', 1, 1, 1),
+    ('TextureRotationPivot', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('TextureScalingPivot', 'Vector3D', 'Vector', '', 0, 0, 0),
+    ('CurrentTextureBlendMode', 'enum', '', '', 1),
+    ('UVSet', 'KString', '', '', 'default'),
+    ('UseMaterial', 'bool', '', '', 0),
+    ('UseMipMap', 'bool', '', '', 0),
+)
+
+
+def _name_class(name: str, class_name: str) -> str:
+    # "Class::Name" in ASCII FBX is "Name\x00\x01Class" in binary FBX
+    return name + '\x00\x01' + class_name
+
+
+def _prop_bool(value: bool) -> bytes:
+    return b'C' + (b'\x01' if value else b'\x00')
+
+
+def _prop_i32(value: int) -> bytes:
+    return b'I' + struct.pack('<i', value)
+
+
+def _prop_i64(value: int) -> bytes:
+    return b'L' + struct.pack('<q', int(value))
+
+
+def _prop_f64(value: float) -> bytes:
+    return b'D' + struct.pack('<d', value)
+
+
+def _prop_str(value: str) -> bytes:
+    data = value.encode('utf-8')
+    return b'S' + struct.pack('<I', len(data)) + data
+
+
+def _prop_raw(value: bytes) -> bytes:
+    return b'R' + struct.pack('<I', len(value)) + value
+
+
+class FbxBinaryDocument:
+    # see fbx.FbxDocument, the stream has to be binary and seekable
+    def __init__(self, name: str, version: int = 7400, compress: bool = True, stream=None):
+        if version != 7400 and version != 7500:
+            raise ValueError("Unsupported binary FBX version: " + str(version))
+        if stream is not None and not stream.seekable():
+            raise ValueError("Binary FBX requires a seekable stream")
+        self.version = version
+        self.compress = compress
+        if version >= 7500:
+            self.node_header = struct.Struct('<QQQ')
+            self.end_offset = struct.Struct('<Q')
+        else:
+            self.node_header = struct.Struct('<III')
+            self.end_offset = struct.Struct('<I')
+        self.null_record = b'\x00' * (self.node_header.size + 1)
+
+        self.scene_objects = dict()
+        self.stream = stream
+        self.stream_base = stream.tell() if stream is not None else 0
+        self.out = io.BytesIO()
+        # file offset of the first byte in self.out
+        self.out_base = 0
+        # [start offset, number of properties, has children] for every open node
+        self.node_stack = []
+        self.connections = []
+        self.named_connections = []
+        # see fbx.FbxDocument.geometries
+        self.geometries = dict()
+        self._create_header(name)
+        self._begin_objects()
+
+    # same naming rules as the ASCII writer
+    _get_unique_name = fbx.FbxDocument._get_unique_name
+
+    def _begin_node(self, name: str, *props):
+        if self.node_stack:
+            self.node_stack[-1][2] = True
+        props_data = b''.join(props)
+        name_data = name.encode('utf-8')
+        start = self.out_base + self.out.tell()
+        self.out.write(self.node_header.pack(0, len(props), len(props_data)))
+        self.out.write(struct.pack('<B', len(name_data)))
+        self.out.write(name_data)
+        self.out.write(props_data)
+        self.node_stack.append([start, len(props), False])
+
+    def _end_node(self):
+        start, num_props, has_children = self.node_stack.pop()
+        if has_children or num_props == 0:
+            self.out.write(self.null_record)
+        end = self.out_base + self.out.tell()
+        if start >= self.out_base:
+            self.out.seek(start - self.out_base)
+            self.out.write(self.end_offset.pack(end))
+            self.out.seek(end - self.out_base)
+        else:
+            # node header is already in the stream
+            self._flush()
+            self.stream.seek(self.stream_base + start)
+            self.stream.write(self.end_offset.pack(end))
+            self.stream.seek(self.stream_base + end)
+
+        if len(self.node_stack) <= 1 and self.out.tell() >= _FLUSH_THRESHOLD:
+            self._flush()
+
+    def _flush(self):
+        if self.stream is None:
+            return
+        self.stream.write(self.out.getbuffer())
+        self.out_base += self.out.tell()
+        self.out = io.BytesIO()
+
+    def _node(self, name: str, *props):
+        self._begin_node(name, *props)
+        self._end_node()
+
+    def _prop_array(self, typecode: str, values) -> bytes:
+        # typecode: 'd' - float64, 'i' - int32
+        data = array.array(typecode, values)
+        if sys.byteorder != 'little':
+            data.byteswap()
+        data = data.tobytes()
+        count = len(data) // (8 if typecode == 'd' else 4)
+        encoding = 0
+        if self.compress and len(data) >= _COMPRESSION_THRESHOLD:
+            data = zlib.compress(data, 1)
+            encoding = 1
+        return typecode.encode('ascii') + struct.pack('<III', count, encoding, len(data)) + data
+
+    def _p(self, name: str, type_name: str, label: str, flags: str, *values):
+        props = [_prop_str(name), _prop_str(type_name), _prop_str(label), _prop_str(flags)]
+        for value in values:
+            if type_name in _P_INT_TYPES:
+                props.append(_prop_i32(value))
+            elif type_name in _P_LONG_TYPES:
+                props.append(_prop_i64(value))
+            elif type_name in _P_STRING_TYPES:
+                props.append(_prop_str(value))
+            else:
+                props.append(_prop_f64(value))
+        self._node('P', *props)
+
+    def _properties70(self, properties):
+        self._begin_node('Properties70')
+        for p in properties:
+            self._p(*p)
+        self._end_node()
+
+    def _object_type(self, type_name: str, template_name: str = None, properties=None):
+        self._begin_node('ObjectType', _prop_str(type_name))
+        self._node('Count', _prop_i32(1))
+        if template_name is not None:
+            self._begin_node('PropertyTemplate', _prop_str(template_name))
+            self._properties70(properties)
+            self._end_node()
+        self._end_node()
+
+    def _create_header(self, name: str):
+        name = fbx.get_filename_without_ext(name)
+
+        self.out.write(_HEAD_MAGIC)
+        self.out.write(struct.pack('<I', self.version))
+
+        self._begin_node('FBXHeaderExtension')
+        self._node('FBXHeaderVersion', _prop_i32(1003))
+        self._node('FBXVersion', _prop_i32(self.version))
+        self._node('EncryptionType', _prop_i32(0))
+
+        d = datetime.datetime.today()
+        self._begin_node('CreationTimeStamp')
+        self._node('Version', _prop_i32(1000))
+        self._node('Year', _prop_i32(d.year))
+        self._node('Month', _prop_i32(d.month))
+        self._node('Day', _prop_i32(d.day))
+        self._node('Hour', _prop_i32(d.hour))
+        self._node('Minute', _prop_i32(d.minute))
+        self._node('Second', _prop_i32(d.second))
+        self._node('Millisecond', _prop_i32(round(d.microsecond / 1000)))
+        self._end_node()
+
+        self._node('Creator', _prop_str('The Forge FBX Exporter'))
+        self._begin_node('SceneInfo', _prop_str(_name_class('GlobalInfo', 'SceneInfo')), _prop_str('UserData'))
+        self._node('Type', _prop_str('UserData'))
+        self._node('Version', _prop_i32(100))
+        self._begin_node('MetaData')
+        self._node('Version', _prop_i32(100))
+        for field in ('Title', 'Subject', 'Author', 'Keywords', 'Revision', 'Comment'):
+            self._node(field, _prop_str(''))
+        self._end_node()
+        self._properties70((
+            ('DocumentUrl', 'KString', 'Url', '', name + '.fbx'),
+            ('SrcDocumentUrl', 'KString', 'Url', '', name + '.fbx'),
+            ('Original', 'Compound', '', ''),
+            ('Original|ApplicationVendor', 'KString', '', '', ''),
+            ('Original|ApplicationName', 'KString', '', '', ''),
+            ('Original|ApplicationVersion', 'KString', '', '', ''),
+            ('Original|DateTime_GMT', 'DateTime', '', '', ''),
+            ('Original|FileName', 'KString', '', '', ''),
+            ('LastSaved', 'Compound', '', ''),
+            ('LastSaved|ApplicationVendor', 'KString', '', '', ''),
+            ('LastSaved|ApplicationName', 'KString', '', '', ''),
+            ('LastSaved|ApplicationVersion', 'KString', '', '', ''),
+            ('LastSaved|DateTime_GMT', 'DateTime', '', '', ''),
+        ))
+        self._end_node()
+        self._end_node()
+
+        self._node('FileId', _prop_raw(_FILE_ID))
+        self._node('CreationTime', _prop_str(_TIME_ID))
+        self._node('Creator', _prop_str('The Forge FBX Exporter'))
+
+        self._begin_node('GlobalSettings')
+        self._node('Version', _prop_i32(1000))
+        self._properties70(_GLOBAL_SETTINGS)
+        self._end_node()
+
+        self._node('References')
+
+        self._begin_node('Definitions')
+        self._node('Version', _prop_i32(100))
+        self._node('Count', _prop_i32(8))
+        self._object_type('GlobalSettings')
+        self._object_type('Model', 'FbxNode', _MODEL_TEMPLATE)
+        self._object_type('CollectionExclusive', 'FbxDisplayLayer', _DISPLAY_LAYER_TEMPLATE)
+        self._object_type('NodeAttribute', 'FbxNull', _NULL_TEMPLATE)
+        self._object_type('Pose')
+        self._object_type('Deformer')
+        self._object_type('Geometry', 'FbxMesh', _MESH_TEMPLATE)
+        self._object_type('Material', 'FbxSurfaceLambert', _LAMBERT_TEMPLATE)
+        self._object_type('Texture', 'FbxFileTexture', _FILE_TEXTURE_TEMPLATE)
+        self._end_node()
+        return
+
+    def _begin_objects(self):
+        self._begin_node('Objects')
+        return
+
+    def _end_objects(self):
+        self._end_node()
+        return
+
+    def _begin_model(self, uid: str, name: str, model_type: str):
+        self._begin_node('Model', _prop_i64(uid), _prop_str(_name_class(name, 'Model')), _prop_str(model_type))
+        self._node('Version', _prop_i32(232))
+
+    def _end_model(self, shading: bool):
+        self._node('Shading', _prop_bool(shading))
+        self._node('Culling', _prop_str('CullingOff'))
+        self._end_node()
+
+    def create_layer(self, name: str, color: fbx.FbxColor4):
+        name = self._get_unique_name(name)
+        uid = fbx.fbx_generate_id()
+        self._begin_node('CollectionExclusive', _prop_i64(uid), _prop_str(_name_class(name, 'DisplayLayer')),
+                         _prop_str('DisplayLayer'))
+        self._properties70((('Color', 'ColorRGB', 'Color', '', color.r, color.g, color.b),))
+        self._end_node()
+        return uid
+
+    def create_group(self, group_name: str, parent_id: int = 0):
+        group_name = self._get_unique_name(group_name)
+        uid = fbx.fbx_generate_id()
+        self._begin_model(uid, group_name, 'Null')
+        self._properties70((
+            ('RotationActive', 'bool', '', '', 1),
+            ('InheritType', 'enum', '', '', 1),
+            ('ScalingMax', 'Vector3D', 'Vector', '', 0, 0, 0),
+            ('DefaultAttributeIndex', 'int', 'Integer', '', 0),
+        ))
+        self._end_model(True)
+        self.connections.append((uid, parent_id))
+        return uid
+
+    def create_locator(self, locator_name: str, t: fbx.FbxTransform, parent_id: int = 0):
+        locator_name = self._get_unique_name(locator_name)
+        attr_uid = fbx.fbx_generate_id()
+        self._begin_node('NodeAttribute', _prop_i64(attr_uid), _prop_str(_name_class('', 'NodeAttribute')),
+                         _prop_str('Null'))
+        self._node('TypeFlags', _prop_str('Null'))
+        self._end_node()
+
+        uid = fbx.fbx_generate_id()
+        self._begin_model(uid, locator_name, 'Null')
+        self._properties70((
+            ('RotationActive', 'bool', '', '', 1),
+            ('InheritType', 'enum', '', '', 1),
+            ('ScalingMax', 'Vector3D', 'Vector', '', 0, 0, 0),
+            ('DefaultAttributeIndex', 'int', 'Integer', '', 0),
+            ('Lcl Translation', 'Lcl Translation', '', 'A', t.px, t.py, t.pz),
+            ('Lcl Rotation', 'Lcl Rotation', '', 'A', t.rx, t.ry, t.rz),
+            ('Lcl Scaling', 'Lcl Scaling', '', 'A', t.sx, t.sy, t.sz),
+        ))
+        self._end_model(True)
+        self.connections.append((uid, parent_id))
+        self.connections.append((attr_uid, uid))
+        return uid
+
+    def create_bone(self, bone_name: str, t: fbx.FbxTransform, parent_id: int = 0):
+        bone_name = self._get_unique_name(bone_name)
+        attr_uid = fbx.fbx_generate_id()
+        self._begin_node('NodeAttribute', _prop_i64(attr_uid), _prop_str(_name_class('', 'NodeAttribute')),
+                         _prop_str('LimbNode'))
+        self._properties70((('Size', 'double', 'Number', '', 10.0),))
+        self._node('TypeFlags', _prop_str('Skeleton'))
+        self._end_node()
+
+        uid = fbx.fbx_generate_id()
+        self._begin_model(uid, bone_name, 'LimbNode')
+        self._properties70((
+            ('PreRotation', 'Vector3D', 'Vector', '', 0, 0, 0),
+            ('RotationActive', 'bool', '', '', 1),
+            ('InheritType', 'enum', '', '', 1),
+            ('ScalingMax', 'Vector3D', 'Vector', '', 0, 0, 0),
+            ('DefaultAttributeIndex', 'int', 'Integer', '', 0),
+            ('Lcl Translation', 'Lcl Translation', '', 'A', t.px, t.py, t.pz),
+            ('Lcl Rotation', 'Lcl Rotation', '', 'A', t.rx, t.ry, t.rz),
+            ('Lcl Scaling', 'Lcl Scaling', '', 'A', t.sx, t.sy, t.sz),
+        ))
+        self._end_model(True)
+        self.connections.append((uid, parent_id))
+        self.connections.append((attr_uid, uid))
+        return uid
+
+    def create_texture(self, texture_name: str, file_name: str, mat_id: int, connection_name: str = "DiffuseColor"):
+        texture_name = self._get_unique_name(texture_name)
+        uid = fbx.fbx_generate_id()
+        self._begin_node('Texture', _prop_i64(uid), _prop_str(_name_class(texture_name, 'Texture')), _prop_str(''))
+        self._node('Type', _prop_str('TextureVideoClip'))
+        self._node('Version', _prop_i32(202))
+        self._node('TextureName', _prop_str(_name_class(texture_name, 'Texture')))
+        self._properties70((
+            ('CurrentTextureBlendMode', 'enum', '', '', 0),
+            ('UVSet', 'KString', '', '', 'map1'),
+            ('UseMaterial', 'bool', '', '', 1),
+        ))
+        self._node('Media', _prop_str(_name_class(texture_name, 'Video')))
+        self._node('FileName', _prop_str(file_name))
+        self._node('RelativeFilename', _prop_str(file_name))
+        self._node('ModelUVTranslation', _prop_f64(0), _prop_f64(0))
+        self._node('ModelUVScaling', _prop_f64(1), _prop_f64(1))
+        self._node('Texture_Alpha_Source', _prop_str('None'))
+        self._node('Cropping', _prop_i32(0), _prop_i32(0), _prop_i32(0), _prop_i32(0))
+        self._end_node()
+        self.named_connections.append((uid, mat_id, connection_name))
+        return uid
+
+    def create_material(self, material_name: str, color: fbx.FbxColor4):
+        material_name = self._get_unique_name(material_name)
+        r = color.r
+        g = color.g
+        b = color.b
+        a = color.a
+        t = 1.0 - a
+        uid = fbx.fbx_generate_id()
+        self._begin_node('Material', _prop_i64(uid), _prop_str(_name_class(material_name, 'Material')),
+                         _prop_str(''))
+        self._node('Version', _prop_i32(102))
+        self._node('ShadingModel', _prop_str('lambert'))
+        self._node('MultiLayer', _prop_i32(0))
+        self._properties70((
+            ('AmbientColor', 'Color', '', 'A', 0, 0, 0),
+            ('DiffuseColor', 'Color', '', 'A', r, g, b),
+            ('DiffuseFactor', 'Number', '', 'A', 1.0),
+            ('TransparentColor', 'Color', '', 'A', t, t, t),
+            ('TransparencyFactor', 'Number', '', 'A', 1),
+            ('Emissive', 'Vector3D', 'Vector', '', 0, 0, 0),
+            ('Ambient', 'Vector3D', 'Vector', '', 0, 0, 0),
+            ('Diffuse', 'Vector3D', 'Vector', '', r, g, b),
+            ('Opacity', 'double', 'Number', '', a),
+        ))
+        self._end_node()
+        return uid, material_name
+
+    # see fbx.FbxDocument.connect_objects
+    def connect_objects(self, object_id: int, layer_id: int):
+        if object_id == 0 or layer_id == 0:
+            return
+        self.connections.append((object_id, layer_id))
+
+    def _layer_element(self, name: str, index: int, element_name: str, mapping: str, reference: str):
+        self._begin_node(name, _prop_i32(index))
+        self._node('Version', _prop_i32(101))
+        self._node('Name', _prop_str(element_name))
+        self._node('MappingInformationType', _prop_str(mapping))
+        self._node('ReferenceInformationType', _prop_str(reference))
+
+    # see fbx.FbxDocument.create_geometry
+    def create_geometry(self, geo: fbx.FbxGeometry) -> str:
+        entry = self.geometries.get(id(geo), None)
+        if entry is not None:
+            return entry[1]
+
+        geom_id = fbx.fbx_generate_id()
+        self._begin_node('Geometry', _prop_i64(geom_id), _prop_str(_name_class('', 'Geometry')), _prop_str('Mesh'))
+
+        positions, polygon_indices, normals, uvs = fbx.get_geometry_arrays(geo)
+
+        self._node('Vertices', self._prop_array('d', positions))
+        self._node('PolygonVertexIndex', self._prop_array('i', polygon_indices))
+        self._node('GeometryVersion', _prop_i32(124))
+
+        # vertex normals
+        self._layer_element('LayerElementNormal', 0, '', 'ByPolygonVertex', 'Direct')
+        self._node('Normals', self._prop_array('d', normals))
+        self._end_node()
+
+        # UV coordinates
+        self._layer_element('LayerElementUV', 0, 'map1', 'ByPolygonVertex', 'IndexToDirect')
+        self._node('UV', self._prop_array('d', uvs))
+        self._node('UVIndex', self._prop_array('i', geo.indices))
+        self._end_node()
+
+        self._layer_element('LayerElementMaterial', 0, '', 'AllSame', 'IndexToDirect')
+        self._node('Materials', self._prop_array('i', (0,)))
+        self._end_node()
+
+        self._begin_node('Layer', _prop_i32(0))
+        self._node('Version', _prop_i32(101))
+        for element_type in ('LayerElementNormal', 'LayerElementMaterial', 'LayerElementUV'):
+            self._begin_node('LayerElement')
+            self._node('Type', _prop_str(element_type))
+            self._node('TypedIndex', _prop_i32(0))
+            self._end_node()
+        self._end_node()
+
+        self._end_node()
+        self.geometries[id(geo)] = (geo, geom_id)
+        return geom_id
+
+    def create_mesh(self, mesh_name: str, t: fbx.FbxTransform, geo,
+                    material_id: int = 0, parent_id: int = 0):
+        mesh_name = self._get_unique_name(mesh_name)
+        if isinstance(geo, fbx.FbxGeometry):
+            geom_id = self.create_geometry(geo)
+        else:
+            geom_id = geo
+
+        # model (transform)
+        uid = fbx.fbx_generate_id()
+        self._begin_model(uid, mesh_name, 'Mesh')
+        self._properties70((
+            ('RotationOrder', 'enum', '', '', 0),
+            ('RotationActive', 'bool', '', '', 1),
+            ('InheritType', 'enum', '', '', 1),
+            ('ScalingMax', 'Vector3D', 'Vector', '', 0, 0, 0),
+            ('DefaultAttributeIndex', 'int', 'Integer', '', 0),
+            ('Lcl Translation', 'Lcl Translation', '', 'A', t.px, t.py, t.pz),
+            ('Lcl Rotation', 'Lcl Rotation', '', 'A', t.rx, t.ry, t.rz),
+            ('Lcl Scaling', 'Lcl Scaling', '', 'A', t.sx, t.sy, t.sz),
+            ('currentUVSet', 'KString', '', 'U', 'map1'),
+        ))
+        self._end_model(True)
+
+        if material_id != 0:
+            self.connections.append((material_id, uid))
+
+        self.connections.append((uid, parent_id))
+        self.connections.append((geom_id, uid))
+
+        return uid
+
+    def finalize(self) -> bytes or None:
+        self._end_objects()
+
+        self._begin_node('Connections')
+        for node_id, parent_id in self.connections:
+            self._node('C', _prop_str('OO'), _prop_i64(node_id), _prop_i64(parent_id))
+
+        for node_id, parent_id, name in self.named_connections:
+            self._node('C', _prop_str('OP'), _prop_i64(node_id), _prop_i64(parent_id), _prop_str(name))
+        self._end_node()
+
+        # end of top level node list
+        self.out.write(self.null_record)
+
+        # footer
+        self.out.write(_FOOT_ID)
+        self.out.write(b'\x00' * 4)
+        # align to 16 bytes (full 16 bytes if already aligned)
+        offset = self.out_base + self.out.tell()
+        padding = ((offset + 15) & ~15) - offset
+        if padding == 0:
+            padding = 16
+        self.out.write(b'\x00' * padding)
+        self.out.write(struct.pack('<I', self.version))
+        self.out.write(b'\x00' * 120)
+        self.out.write(_FOOT_MAGIC)
+        if self.stream is not None:
+            self._flush()
+            return None
+        return self.out.getvalue()
@@ -0,0 +1,154 @@
+# The MIT License (MIT)
+#
+# 	Copyright (c) 2019 Sergey Makeev
+#
+# 	Permission is hereby granted, free of charge, to any person obtaining a copy
+# 	of this software and associated documentation files (the "Software"), to deal
+# 	in the Software without restriction, including without limitation the rights
+# 	to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# 	copies of the Software, and to permit persons to whom the Software is
+# 	furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in
+# 	all copies or substantial portions of the Software.
+#
+# 	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# 	THE SOFTWARE.
+import time
+import random
+import threading
+import urllib.error
+import logger
+
+#
+# Asset fetch policy
+#
+# - permanent failures (403, 404, ...) are remembered for 'negative_ttl' seconds and not requested again
+# - transient failures (429, 5xx, connection errors) are retried with exponential backoff and full jitter,
+#   'Retry-After' is honored when the server sends it
+# - all requests go through a global token bucket rate limiter
+#
+# clock/sleep/rng can be replaced to test the policy without real delays
+#
+
+PERMANENT_ERROR_CODES = (400, 401, 403, 404, 410)
+TRANSIENT_ERROR_CODES = (408, 429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = 1, clock=time.monotonic, sleep=time.sleep):
+        # rate <= 0 means unlimited
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(self.burst)
+        self.last_time = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(float(self.burst), self.tokens + (now - self.last_time) * self.rate)
+            self.last_time = now
+            # take the token in advance, negative balance is the time the caller has to wait
+            self.tokens -= 1.0
+            wait_time = -self.tokens / self.rate
+        if wait_time > 0:
+            self.sleep(wait_time)
+
+
+class NegativeCache:
+    def __init__(self, ttl: float, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        # url -> (expiration time, error message)
+        self.entries = dict()
+
+    def get(self, url: str) -> str or None:
+        with self.lock:
+            entry = self.entries.get(url, None)
+            if entry is None:
+                return None
+            expiration_time, error = entry
+            if self.clock() >= expiration_time:
+                del self.entries[url]
+                return None
+            return error
+
+    def put(self, url: str, error: str):
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self.entries[url] = (self.clock() + self.ttl, error)
+
+
+def _get_retry_after(ex: urllib.error.HTTPError) -> float or None:
+    if ex.headers is None:
+        return None
+    value = ex.headers.get('Retry-After', None)
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        # HTTP-date form is not supported
+        return None
+
+
+class FetchPolicy:
+    def __init__(self, max_retries: int = 4, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 negative_ttl: float = 900.0, max_requests_per_second: float = 0.0,
+                 clock=time.monotonic, sleep=time.sleep, rng=None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+        self.rng = rng if rng is not None else random.Random()
+        self.negative_cache = NegativeCache(negative_ttl, clock)
+        self.rate_limiter = RateLimiter(max_requests_per_second, max(1, int(max_requests_per_second)), clock, sleep)
+
+    def get_backoff(self, attempt: int) -> float:
+        # 'full jitter' exponential backoff
+        return self.rng.uniform(0.0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def call(self, url: str, func):
+        # calls func() following the policy, exceptions of the last attempt are propagated to the caller
+        error = self.negative_cache.get(url)
+        if error is not None:
+            raise urllib.error.URLError("Known bad asset (negative cache): " + error)
+
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                return func()
+            except urllib.error.HTTPError as ex:
+                code = ex.getcode()
+                if code in PERMANENT_ERROR_CODES:
+                    self.negative_cache.put(url, str(ex))
+                    raise
+                if code not in TRANSIENT_ERROR_CODES or attempt >= self.max_retries:
+                    raise
+                delay = _get_retry_after(ex)
+                if delay is None:
+                    delay = self.get_backoff(attempt)
+                else:
+                    delay = min(delay, self.backoff_max)
+                logger.warn("Retry '" + url + "' in " + "{:.2f}".format(delay) + "s, code: " + str(code))
+            except urllib.error.URLError as ex:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.get_backoff(attempt)
+                logger.warn("Retry '" + url + "' in " + "{:.2f}".format(delay) + "s, error: " + str(ex.reason))
+
+            self.sleep(delay)
+            attempt += 1
@@ -0,0 +1,58 @@
+# The MIT License (MIT)
+#
+# 	Copyright (c) 2019 Sergey Makeev
+#
+# 	Permission is hereby granted, free of charge, to any person obtaining a copy
+# 	of this software and associated documentation files (the "Software"), to deal
+# 	in the Software without restriction, including without limitation the rights
+# 	to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# 	copies of the Software, and to permit persons to whom the Software is
+# 	furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in
+# 	all copies or substantial portions of the Software.
+#
+# 	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# 	THE SOFTWARE.
+import os
+import tempfile
+
+# temporary files are created next to the target file with this prefix (so directory scans can skip them)
+TEMP_FILE_PREFIX = '.tmp'
+
+# mkstemp() creates files readable by the owner only, written files get the same permissions as open() would give
+# (read once at import time, os.umask() can only be read by setting it)
+_umask = os.umask(0)
+os.umask(_umask)
+
+
+def write_file_atomic(file_path: str, data_or_writer, binary: bool = True, buffering: int = -1):
+    # Writes a file so that readers (other threads or other exporter processes) never see partially written data:
+    # the data goes to a temporary file in the same folder which is moved in place once it's complete
+    # and removed if anything fails.
+    # data_or_writer - bytes/str or a function that is called with the open temporary file,
+    # its return value is returned from write_file_atomic()
+    dir_name = os.path.dirname(file_path) or '.'
+    os.makedirs(dir_name, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=dir_name, prefix=TEMP_FILE_PREFIX)
+    try:
+        os.chmod(temp_path, 0o666 & ~_umask)
+        with os.fdopen(handle, 'wb' if binary else 'w', buffering=buffering) as temp_file:
+            if callable(data_or_writer):
+                result = data_or_writer(temp_file)
+            else:
+                result = None
+                temp_file.write(data_or_writer)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return result
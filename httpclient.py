@@ -0,0 +1,135 @@
+# The MIT License (MIT)
+#
+# 	Copyright (c) 2019 Sergey Makeev
+#
+# 	Permission is hereby granted, free of charge, to any person obtaining a copy
+# 	of this software and associated documentation files (the "Software"), to deal
+# 	in the Software without restriction, including without limitation the rights
+# 	to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# 	copies of the Software, and to permit persons to whom the Software is
+# 	furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in
+# 	all copies or substantial portions of the Software.
+#
+# 	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# 	THE SOFTWARE.
+import ssl
+import threading
+import http.client
+import urllib.error
+import urllib.parse
+
+#
+# Minimal HTTP/1.1 client with per-host persistent (keep-alive) connections
+#
+# Errors are reported the same way urllib.request.urlopen does it:
+#   urllib.error.HTTPError - server responded with 4xx/5xx
+#   urllib.error.URLError - connection level error
+#   ValueError - malformed/unsupported URL
+#
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class HttpResponse:
+    def __init__(self, url: str, status: int, reason: str, headers, body: bytes):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+
+class ConnectionPool:
+    def __init__(self, max_idle_per_host: int = 8, timeout: float = 30.0, max_redirects: int = 5):
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.ssl_context = ssl.create_default_context()
+        self.lock = threading.Lock()
+        # (scheme, host, port) -> list of idle connections
+        self.idle_connections = dict()
+
+    def _acquire(self, key: tuple):
+        with self.lock:
+            connections = self.idle_connections.get(key, None)
+            if connections:
+                return connections.pop(), True
+
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self.ssl_context), False
+        return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+
+    def _release(self, key: tuple, connection):
+        with self.lock:
+            connections = self.idle_connections.setdefault(key, list())
+            if len(connections) < self.max_idle_per_host:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle_connections.values():
+                for connection in connections:
+                    connection.close()
+            self.idle_connections.clear()
+
+    def _request_once(self, url: str, headers: dict) -> HttpResponse:
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme != 'http' and scheme != 'https' or not parts.hostname:
+            raise ValueError("unknown url type: '" + url + "'")
+
+        port = parts.port
+        if port is None:
+            port = 443 if scheme == 'https' else 80
+        key = (scheme, parts.hostname, port)
+
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        while True:
+            connection, is_reused = self._acquire(key)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError) as ex:
+                connection.close()
+                if is_reused:
+                    # idle connection was closed by the server, retry with a fresh one
+                    continue
+                raise urllib.error.URLError(ex)
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(key, connection)
+            return HttpResponse(url, response.status, response.reason, response.headers, body)
+
+    def get(self, url: str, headers: dict = None) -> HttpResponse:
+        # GET request that follows redirects, response.url is the final URL
+        if headers is None:
+            headers = dict()
+
+        for _ in range(self.max_redirects + 1):
+            response = self._request_once(url, headers)
+            location = response.headers.get('Location', None)
+            if response.status in REDIRECT_CODES and location is not None:
+                url = urllib.parse.urljoin(url, location)
+                continue
+
+            if response.status >= 400:
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+            return response
+
+        raise urllib.error.URLError("Too many redirects: '" + url + "'")
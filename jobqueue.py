@@ -0,0 +1,124 @@
+# The MIT License (MIT)
+#
+# 	Copyright (c) 2019 Sergey Makeev
+#
+# 	Permission is hereby granted, free of charge, to any person obtaining a copy
+# 	of this software and associated documentation files (the "Software"), to deal
+# 	in the Software without restriction, including without limitation the rights
+# 	to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# 	copies of the Software, and to permit persons to whom the Software is
+# 	furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in
+# 	all copies or substantial portions of the Software.
+#
+# 	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# 	THE SOFTWARE.
+import time
+import uuid
+import threading
+import traceback
+import collections
+import concurrent.futures
+import logger
+
+#
+# Bounded export job queue
+#
+# - jobs run on a fixed number of worker threads
+# - at most 'max_pending' jobs can be queued or running, submit() returns None when the queue is full
+# - finished jobs are kept for polling, the oldest ones are dropped after 'max_finished'
+#
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+class Job:
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = JOB_QUEUED
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.done_event = threading.Event()
+
+    def is_finished(self) -> bool:
+        return self.status == JOB_DONE or self.status == JOB_FAILED
+
+    def wait(self, timeout: float = None) -> bool:
+        return self.done_event.wait(timeout)
+
+    def to_dict(self) -> dict:
+        return {"id": self.id,
+                "status": self.status,
+                "submitted": self.submitted,
+                "started": self.started,
+                "finished": self.finished,
+                "result": self.result,
+                "error": self.error}
+
+
+class JobQueue:
+    def __init__(self, max_workers: int, max_pending: int, max_finished: int = 1000):
+        self.max_pending = max(1, max_pending)
+        self.max_finished = max_finished
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                                              thread_name_prefix='export')
+        self.lock = threading.Lock()
+        # job id -> Job, in submission order
+        self.jobs = collections.OrderedDict()
+        self.pending = 0
+
+    def submit(self, func, *args) -> Job or None:
+        with self.lock:
+            if self.pending >= self.max_pending:
+                return None
+            self.pending += 1
+            job = Job(uuid.uuid4().hex)
+            self.jobs[job.id] = job
+            self._drop_finished()
+        self.executor.submit(self._run, job, func, args)
+        return job
+
+    def get(self, job_id: str) -> Job or None:
+        with self.lock:
+            return self.jobs.get(job_id, None)
+
+    def _run(self, job: Job, func, args):
+        with self.lock:
+            job.status = JOB_RUNNING
+            job.started = time.time()
+
+        status = JOB_DONE
+        result = None
+        error = None
+        try:
+            result = func(*args)
+        except BaseException as ex:
+            # logger.fatal raises SystemExit, it should only fail the job
+            status = JOB_FAILED
+            error = str(ex) or type(ex).__name__
+            logger.warn("Job " + job.id + " failed: " + error + "\n" + traceback.format_exc())
+
+        with self.lock:
+            job.result = result
+            job.error = error
+            job.status = status
+            job.finished = time.time()
+            self.pending -= 1
+        job.done_event.set()
+
+    def _drop_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.is_finished()]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
@@ -20,28 +20,130 @@
 # 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # 	THE SOFTWARE.
 import sys
+import json
+import time
+import atexit
+import threading
 import traceback
 
+#
+# Logger
+#
+# - messages below 'level' are dropped before they are formatted, use arguments for lazy formatting:
+#   logger.debug("FBX Mesh: %s", node.name)
+# - 'text' format prints messages as is ('WARNING: ...', 'ERROR: ...'), 'json' prints one JSON object per line
+# - buffered sink collects lines and writes them in large chunks (at 64KB, on errors and at exit)
+# - error/fatal include the call stack only at DEBUG level
+#
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+FATAL = 50
+
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR, 'fatal': FATAL}
+_LEVEL_NAMES = dict((value, name) for name, value in LEVELS.items())
+_TEXT_PREFIXES = {DEBUG: '', INFO: '', WARNING: 'WARNING: ', ERROR: 'ERROR: ', FATAL: 'FATAL: '}
+
+_BUFFER_FLUSH_SIZE = 64 * 1024
+
+level = INFO
+log_format = 'text'
+# None - current sys.stdout
+_stream = None
+_buffered = False
+_buffer = []
+_buffer_size = 0
+_lock = threading.Lock()
+
+
+def configure(log_level: int = INFO, output_format: str = 'text', stream=None, buffered: bool = False):
+    global level, log_format, _stream, _buffered
+    flush()
+    level = log_level
+    log_format = output_format
+    _stream = stream
+    _buffered = buffered
+
+
+def is_enabled(msg_level: int) -> bool:
+    return msg_level >= level
 
-def message(msg):
-    print(msg)
 
+def flush():
+    global _buffer_size
+    with _lock:
+        if not _buffer:
+            return
+        text = ''.join(_buffer)
+        _buffer.clear()
+        _buffer_size = 0
+        stream = _stream if _stream is not None else sys.stdout
+        stream.write(text)
+        stream.flush()
 
-def error(msg):
-    print("ERROR: " + msg)
-    sys.stderr.write(msg + "\n")
-    for line in traceback.format_stack():
-        print(line.strip())
 
+def _write(msg_level: int, msg: str, args: tuple, stack: bool = False):
+    global _buffer_size
+    if args:
+        msg = msg % args
+    if stack and level <= DEBUG:
+        msg += "\n" + ''.join(traceback.format_stack()[:-2])
 
-def warn(msg):
-    print("WARNING: " + msg)
+    if log_format == 'json':
+        line = json.dumps({"ts": time.time(),
+                           "level": _LEVEL_NAMES[msg_level],
+                           "thread": threading.current_thread().name,
+                           "message": msg}) + "\n"
+    else:
+        line = _TEXT_PREFIXES[msg_level] + msg + "\n"
 
+    with _lock:
+        if _buffered:
+            _buffer.append(line)
+            _buffer_size += len(line)
+            if _buffer_size < _BUFFER_FLUSH_SIZE and msg_level < ERROR:
+                return
+            line = ''.join(_buffer)
+            _buffer.clear()
+            _buffer_size = 0
+        stream = _stream if _stream is not None else sys.stdout
+        stream.write(line)
 
-def fatal(msg):
-    print("FATAL: " + msg)
-    sys.stderr.write(msg + "\n")
-    for line in traceback.format_stack():
-        print(line.strip())
+
+def debug(msg, *args):
+    if DEBUG >= level:
+        _write(DEBUG, msg, args)
+
+
+def message(msg, *args):
+    if INFO >= level:
+        _write(INFO, msg, args)
+
+
+def warn(msg, *args):
+    if WARNING >= level:
+        _write(WARNING, msg, args)
+
+
+def error(msg, *args):
+    if ERROR >= level:
+        _write(ERROR, msg, args, True)
+        # console errors are also echoed to stderr
+        if _stream is None and log_format == 'text':
+            sys.stderr.write((msg % args if args else msg) + "\n")
+
+
+def fatal(msg, *args):
+    if args:
+        msg = msg % args
+    _write(FATAL, msg, (), True)
+    flush()
+    if _stream is None and log_format == 'text':
+        sys.stderr.write(msg + "\n")
 
     raise SystemExit(msg)
+
+
+atexit.register(flush)
@@ -0,0 +1,102 @@
+# The MIT License (MIT)
+#
+# 	Copyright (c) 2019 Sergey Makeev
+#
+# 	Permission is hereby granted, free of charge, to any person obtaining a copy
+# 	of this software and associated documentation files (the "Software"), to deal
+# 	in the Software without restriction, including without limitation the rights
+# 	to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# 	copies of the Software, and to permit persons to whom the Software is
+# 	furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in
+# 	all copies or substantial portions of the Software.
+#
+# 	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# 	THE SOFTWARE.
+import os
+import json
+import hashlib
+import logger
+import fileutil
+
+#
+# Export manifests
+#
+# A manifest is saved next to every exported model and records what the export was made from:
+# - exporter version (bumped whenever the FBX output changes)
+# - hash of the model description and the export options
+# - hashes of the fetched assets
+# - output files and their sizes
+#
+# A re-export of the same description by the same exporter version is skipped while the outputs are intact
+# and all of its assets were fetched.
+#
+
+
+def get_desc_hash(model_desc, options: dict) -> str:
+    # key order of the description JSON does not matter
+    h256 = hashlib.sha256()
+    h256.update(json.dumps(model_desc, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+    h256.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+    return h256.hexdigest()
+
+
+def create(version: str, desc_hash: str, assets: dict, failed_assets: list, folder: str, files: list) -> dict:
+    # assets - url -> payload hash (None if fetch failed), failed_assets - fetched but unsupported assets
+    # files - output file names relative to 'folder'
+    return {"version": version,
+            "desc_hash": desc_hash,
+            "assets": assets,
+            "failed_assets": failed_assets,
+            "files": {file_name: os.path.getsize(os.path.join(folder, file_name)) for file_name in files}}
+
+
+def load(file_name: str) -> dict or None:
+    try:
+        with open(file_name, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+    return manifest if isinstance(manifest, dict) else None
+
+
+def save(file_name: str, manifest: dict):
+    try:
+        fileutil.write_file_atomic(file_name, json.dumps(manifest, indent=2, sort_keys=True), binary=False)
+    except OSError as ex:
+        logger.warn("Can't save manifest '" + file_name + "': " + str(ex))
+
+
+def remove(file_name: str):
+    try:
+        os.remove(file_name)
+    except OSError:
+        pass
+
+
+def is_up_to_date(manifest: dict or None, version: str, desc_hash: str, folder: str) -> bool:
+    # same exporter, same description, all assets fetched and every output file is still there
+    if manifest is None or manifest.get("version", None) != version or manifest.get("desc_hash", None) != desc_hash:
+        return False
+
+    # some assets could not be fetched, the export is partial and has to be retried
+    assets = manifest.get("assets", None)
+    if not isinstance(assets, dict) or None in assets.values():
+        return False
+
+    files = manifest.get("files", None)
+    if not isinstance(files, dict) or len(files) == 0:
+        return False
+    for file_name, file_size in files.items():
+        try:
+            if os.path.getsize(os.path.join(folder, file_name)) != file_size:
+                return False
+        except OSError:
+            return False
+    return True
@@ -0,0 +1,85 @@
+# The MIT License (MIT)
+#
+# 	Copyright (c) 2019 Sergey Makeev
+#
+# 	Permission is hereby granted, free of charge, to any person obtaining a copy
+# 	of this software and associated documentation files (the "Software"), to deal
+# 	in the Software without restriction, including without limitation the rights
+# 	to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# 	copies of the Software, and to permit persons to whom the Software is
+# 	furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in
+# 	all copies or substantial portions of the Software.
+#
+# 	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# 	THE SOFTWARE.
+import os
+import multiprocessing
+import concurrent.futures
+import rbmesh
+import metrics
+
+#
+# Process pool for CPU-bound mesh processing
+#
+# MeshPart payloads are parsed, transformed and converted to FBX geometry in worker processes.
+# Geometry is sent back as raw array buffers (fbx.FbxGeometry.to_buffers), not as pickled objects.
+# Every worker keeps its own cache of parsed meshes. A payload already sent to the pool is not sent again,
+# the worker gets the payload hash only and returns PAYLOAD_REQUIRED if it doesn't have the mesh cached.
+# Stages and counters (mesh cache hits/misses) are recorded in the worker and returned with the geometry,
+# the caller adds them to its export with metrics.merge().
+#
+
+# parsed meshes of this worker process, created by init_worker()
+mesh_cache = None
+
+# returned instead of geometry buffers, the payload was not sent and the mesh is not in the cache of this worker
+PAYLOAD_REQUIRED = 'payload_required'
+
+
+def init_worker(mesh_cache_size: int):
+    global mesh_cache
+    mesh_cache = rbmesh.MeshCache(mesh_cache_size)
+
+
+def _build_geometry(payload_hash: str, payload: bytes or None,
+                    matrix: tuple, normal_matrix: tuple, normalize_normals: bool) -> tuple or str or None:
+    if payload is None and payload_hash not in mesh_cache:
+        return PAYLOAD_REQUIRED
+    with metrics.stage('mesh_parse'):
+        mesh = mesh_cache.parse(payload_hash, payload, lazy=True)
+    if mesh is None:
+        return None
+    with metrics.stage('mesh_transform'):
+        rbmesh.transform_mesh(mesh, matrix, normal_matrix, normalize_normals)
+    with metrics.stage('mesh_convert'):
+        return rbmesh.convert_mesh_to_fbx_geometry(mesh, 0).to_buffers()
+
+
+def build_geometry(payload_hash: str, payload: bytes or None,
+                   matrix: tuple, normal_matrix: tuple, normalize_normals: bool, collect_metrics: bool) -> tuple:
+    # payload - None to use the mesh cached by this worker
+    # returns (geometry buffers / None / PAYLOAD_REQUIRED, metrics of this call or None,
+    #          (worker pid, cache entries, cache size))
+    metrics.enabled = collect_metrics
+    collector = metrics.begin_export()
+    try:
+        buffers = _build_geometry(payload_hash, payload, matrix, normal_matrix, normalize_normals)
+    finally:
+        # detach the collector, worker processes don't keep totals
+        metrics.end_export(None, True)
+    cache_state = (os.getpid(), len(mesh_cache.entries), mesh_cache.total_size)
+    return buffers, collector.to_dict() if collector is not None else None, cache_state
+
+
+def create_pool(workers: int, mesh_cache_size: int) -> concurrent.futures.ProcessPoolExecutor:
+    # 'spawn' on every platform, the server process runs HTTP and fetch threads and is not safe to fork
+    context = multiprocessing.get_context('spawn')
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                                  initializer=init_worker, initargs=(mesh_cache_size,))
@@ -0,0 +1,164 @@
+# The MIT License (MIT)
+#
+# 	Copyright (c) 2019 Sergey Makeev
+#
+# 	Permission is hereby granted, free of charge, to any person obtaining a copy
+# 	of this software and associated documentation files (the "Software"), to deal
+# 	in the Software without restriction, including without limitation the rights
+# 	to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# 	copies of the Software, and to permit persons to whom the Software is
+# 	furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in
+# 	all copies or substantial portions of the Software.
+#
+# 	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# 	THE SOFTWARE.
+import time
+import threading
+import contextlib
+
+#
+# Lightweight export instrumentation
+#
+# begin_export() attaches a collector to the current thread, stage() and count() record into it and
+# end_export() adds it to the process-wide totals (see get_totals()).
+# Without a collector (or with 'enabled' set to False) stage() and count() do nothing.
+#
+# Stages can be nested, every stage reports its inclusive wall and CPU (thread) time.
+#
+# Work done in other processes (mesh workers) is recorded there with its own collector and added to
+# the export with merge().
+#
+
+# switched off with --no-metrics
+enabled = True
+
+_local = threading.local()
+_null_stage = contextlib.nullcontext()
+
+
+class ExportMetrics:
+    def __init__(self):
+        # name -> [calls, wall seconds, cpu seconds]
+        self.stages = dict()
+        # name -> value
+        self.counters = dict()
+
+    def add_stage(self, name: str, wall_seconds: float, cpu_seconds: float, calls: int = 1):
+        stage = self.stages.get(name, None)
+        if stage is None:
+            self.stages[name] = [calls, wall_seconds, cpu_seconds]
+        else:
+            stage[0] += calls
+            stage[1] += wall_seconds
+            stage[2] += cpu_seconds
+
+    def add(self, name: str, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self) -> dict:
+        return {"stages": dict((name, {"calls": calls, "wall_seconds": wall, "cpu_seconds": cpu})
+                               for name, (calls, wall, cpu) in self.stages.items()),
+                "counters": dict(self.counters)}
+
+
+class _Stage:
+    def __init__(self, collector: ExportMetrics, name: str):
+        self.collector = collector
+        self.name = name
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+
+    def __enter__(self):
+        self.wall_time = time.perf_counter()
+        self.cpu_time = time.thread_time()
+        return self
+
+    def __exit__(self, *_):
+        self.collector.add_stage(self.name, time.perf_counter() - self.wall_time, time.thread_time() - self.cpu_time)
+        return False
+
+
+class _Totals:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.exports = 0
+        self.failed = 0
+        self.metrics = ExportMetrics()
+
+    def add(self, collector: ExportMetrics, succeeded: bool):
+        with self.lock:
+            self.exports += 1
+            if not succeeded:
+                self.failed += 1
+            for name, (calls, wall, cpu) in collector.stages.items():
+                self.metrics.add_stage(name, wall, cpu, calls)
+            for name, value in collector.counters.items():
+                self.metrics.add(name, value)
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            res = {"enabled": enabled,
+                   "uptime_seconds": time.time() - self.started,
+                   "exports": self.exports,
+                   "failed": self.failed}
+            res.update(self.metrics.to_dict())
+            return res
+
+
+_totals = _Totals()
+
+
+def get_collector() -> ExportMetrics or None:
+    return getattr(_local, 'collector', None)
+
+
+def begin_export() -> ExportMetrics or None:
+    if not enabled:
+        return None
+    collector = ExportMetrics()
+    _local.collector = collector
+    return collector
+
+
+def end_export(collector: ExportMetrics or None, succeeded: bool):
+    _local.collector = None
+    if collector is not None:
+        _totals.add(collector, succeeded)
+
+
+def stage(name: str):
+    # usage: with metrics.stage('fetch'): ...
+    collector = getattr(_local, 'collector', None)
+    if collector is None:
+        return _null_stage
+    return _Stage(collector, name)
+
+
+def count(name: str, value=1):
+    collector = getattr(_local, 'collector', None)
+    if collector is not None:
+        collector.add(name, value)
+
+
+def merge(values: dict or None):
+    # adds ExportMetrics.to_dict() recorded somewhere else to the collector of the current thread
+    collector = getattr(_local, 'collector', None)
+    if collector is None or values is None:
+        return
+    for name, stage_values in values["stages"].items():
+        collector.add_stage(name, stage_values["wall_seconds"], stage_values["cpu_seconds"], stage_values["calls"])
+    for name, value in values["counters"].items():
+        collector.add(name, value)
+
+
+def get_totals() -> dict:
+    # all finished exports since the start
+    return _totals.to_dict()
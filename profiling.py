@@ -0,0 +1,147 @@
+# The MIT License (MIT)
+#
+# 	Copyright (c) 2019 Sergey Makeev
+#
+# 	Permission is hereby granted, free of charge, to any person obtaining a copy
+# 	of this software and associated documentation files (the "Software"), to deal
+# 	in the Software without restriction, including without limitation the rights
+# 	to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# 	copies of the Software, and to permit persons to whom the Software is
+# 	furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in
+# 	all copies or substantial portions of the Software.
+#
+# 	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# 	THE SOFTWARE.
+import os
+import io
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import logger
+
+#
+# Opt-in export profiling
+#
+# 'cpu' - cProfile of the export thread: <prefix>.prof (load with pstats/snakeviz) and <prefix>.prof.txt
+# 'memory' - tracemalloc: <prefix>.alloc.txt with the peak and the top allocation sites
+# 'all' - both
+#
+# Profiled exports run concurrently like any other export:
+# - cProfile only sees the export thread, time spent in asset fetch threads and mesh worker processes shows up
+#   as waiting (fetch_assets, future.result)
+# - tracemalloc is process-wide, it is started by the first memory-profiled export and stopped by the last one,
+#   so allocations and the peak of concurrent exports are included, mesh worker processes are not traced
+#
+
+MODES = ('cpu', 'memory', 'all')
+
+CPU_REPORT_NOTE = ("Only the export thread is profiled: time spent in asset fetch threads and mesh worker processes\n"
+                   "is not included, it shows up as waiting for them (fetch_assets, future.result).\n")
+MEMORY_REPORT_NOTE = ("Traced in the server process only (mesh worker processes are not traced). Allocations of\n"
+                      "concurrent exports are included, the peak is process-wide since tracing started.")
+
+# guards tracemalloc start/stop and the number of exports that use it
+_lock = threading.Lock()
+_tracing_users = 0
+# tracing was started by this module (not by someone else)
+_tracing_owned = False
+
+
+def _start_tracing():
+    global _tracing_users, _tracing_owned
+    with _lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_owned = True
+        _tracing_users += 1
+
+
+def _stop_tracing() -> tuple:
+    # returns (snapshot, peak bytes) of this export
+    global _tracing_users, _tracing_owned
+    with _lock:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+    return snapshot, peak_bytes
+
+
+def _write_cpu_report(profiler: cProfile.Profile, file_prefix: str, top: int) -> list:
+    profiler.dump_stats(file_prefix + '.prof')
+    text = io.StringIO()
+    text.write(CPU_REPORT_NOTE)
+    stats = pstats.Stats(profiler, stream=text)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+    with open(file_prefix + '.prof.txt', 'w') as report_file:
+        report_file.write(text.getvalue())
+    return [file_prefix + '.prof', file_prefix + '.prof.txt']
+
+
+def _write_memory_report(snapshot: tracemalloc.Snapshot, peak_bytes: int, file_prefix: str, top: int) -> list:
+    lines = [MEMORY_REPORT_NOTE,
+             "",
+             "Peak traced memory: {0:.1f} KB".format(peak_bytes / 1024.0),
+             "",
+             "Top {0} allocation sites (still allocated at the end of the export):".format(top)]
+    for index, stat in enumerate(snapshot.statistics('lineno')[:top], 1):
+        frame = stat.traceback[0]
+        lines.append("#{0}: {1}:{2} {3:.1f} KB in {4} blocks".format(
+            index, frame.filename, frame.lineno, stat.size / 1024.0, stat.count))
+    with open(file_prefix + '.alloc.txt', 'w') as report_file:
+        report_file.write("\n".join(lines) + "\n")
+    return [file_prefix + '.alloc.txt']
+
+
+def run(func, args: tuple, file_prefix: str, mode: str, top: int = 30):
+    # calls func(*args) under the profilers selected by 'mode', returns (result, written report files)
+    # reports are written even if func fails, the exception is propagated
+    if mode not in MODES:
+        raise ValueError("Unknown profile mode: " + str(mode))
+    cpu = mode == 'cpu' or mode == 'all'
+    memory = mode == 'memory' or mode == 'all'
+
+    profiler = None
+    if cpu:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as ex:
+            # Python 3.12+ allows one active profiler per process
+            logger.warn("CPU profile is not available: " + str(ex))
+            profiler = None
+    if memory:
+        _start_tracing()
+
+    start_time = time.perf_counter()
+    try:
+        result = func(*args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        snapshot = None
+        peak_bytes = 0
+        if memory:
+            snapshot, peak_bytes = _stop_tracing()
+
+        os.makedirs(os.path.dirname(os.path.abspath(file_prefix)), exist_ok=True)
+        files = list()
+        if profiler is not None:
+            files += _write_cpu_report(profiler, file_prefix, top)
+        if snapshot is not None:
+            files += _write_memory_report(snapshot, peak_bytes, file_prefix, top)
+        logger.message("Profile (%s, %.2fs): %s", mode, time.perf_counter() - start_time, ", ".join(files))
+
+    return result, files
@@ -20,10 +20,21 @@
 # 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # 	THE SOFTWARE.
 import io
+import array
 import struct
+import math
+import threading
+import collections
 import logger
+import metrics
 import fbx
 
+# optional, used to transform vertex arrays in bulk
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class Vertex:
     def __init__(self, px, py, pz, nx, ny, nz, u, v, w, r, g, b, a):
@@ -49,10 +60,84 @@ class Triangle:
         self.i2 = i2
 
 
+def _mesh_array_property(array_name: str, stride: int, component: int):
+    def getter(self):
+        return getattr(self.mesh, array_name)[self.index * stride + component]
+
+    def setter(self, value):
+        getattr(self.mesh, array_name)[self.index * stride + component] = value
+
+    return property(getter, setter)
+
+
+class VertexRef:
+    # Vertex compatible view of a single vertex stored inside the mesh arrays
+    __slots__ = ('mesh', 'index')
+
+    def __init__(self, mesh, index: int):
+        self.mesh = mesh
+        self.index = index
+
+    p_x = _mesh_array_property('positions', 3, 0)
+    p_y = _mesh_array_property('positions', 3, 1)
+    p_z = _mesh_array_property('positions', 3, 2)
+    n_x = _mesh_array_property('normals', 3, 0)
+    n_y = _mesh_array_property('normals', 3, 1)
+    n_z = _mesh_array_property('normals', 3, 2)
+    u = _mesh_array_property('uvs', 3, 0)
+    v = _mesh_array_property('uvs', 3, 1)
+    w = _mesh_array_property('uvs', 3, 2)
+    r = _mesh_array_property('colors', 4, 0)
+    g = _mesh_array_property('colors', 4, 1)
+    b = _mesh_array_property('colors', 4, 2)
+    a = _mesh_array_property('colors', 4, 3)
+
+
+class TriangleRef:
+    # Triangle compatible view of a single triangle stored inside the mesh index array
+    __slots__ = ('mesh', 'index')
+
+    def __init__(self, mesh, index: int):
+        self.mesh = mesh
+        self.index = index
+
+    i0 = _mesh_array_property('indices', 3, 0)
+    i1 = _mesh_array_property('indices', 3, 1)
+    i2 = _mesh_array_property('indices', 3, 2)
+
+
+class MeshElementList:
+    # read-only list of VertexRef/TriangleRef, for code that still iterates mesh.vertices or mesh.triangles
+    def __init__(self, mesh, count: int, ref_type):
+        self.mesh = mesh
+        self.count = count
+        self.ref_type = ref_type
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError("mesh element index out of range")
+        return self.ref_type(self.mesh, index)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.ref_type(self.mesh, index)
+
+
 class Mesh:
     def __init__(self):
-        self.vertices = []
-        self.triangles = []
+        # vertex attributes and indices are stored as flat typed arrays (structure of arrays)
+        self.positions = array.array('d')  # x, y, z
+        self.normals = array.array('d')  # x, y, z
+        self.uvs = array.array('d')  # u, v, w
+        self.colors = array.array('B')  # r, g, b, a
+        self._indices = array.array('I')  # i0, i1, i2
+        # lazy meshes keep a view of the raw face block and decode indices on demand
+        self.face_data = None
         self.lod_data = []
         self.min_x = 99999999.0
         self.min_y = 99999999.0
@@ -61,6 +146,41 @@ class Mesh:
         self.max_y = -99999999.0
         self.max_z = -99999999.0
 
+    @property
+    def vertices(self) -> MeshElementList:
+        return MeshElementList(self, self.get_number_of_vertices(), VertexRef)
+
+    @property
+    def triangles(self) -> MeshElementList:
+        return MeshElementList(self, self.get_number_of_triangles(), TriangleRef)
+
+    def get_number_of_vertices(self):
+        return len(self.positions) // 3
+
+    @property
+    def indices(self) -> array.array:
+        if self.face_data is not None:
+            # lazy mesh, decode the whole face block on first access
+            self._indices.frombytes(self.face_data)
+            self.face_data = None
+        return self._indices
+
+    def get_number_of_triangles(self):
+        if self.face_data is not None:
+            return len(self.face_data) // 12
+        return len(self._indices) // 3
+
+    def get_lod_indices(self, lod: int) -> array.array:
+        face_from = self.lod_data[lod + 0]
+        face_to = self.lod_data[lod + 1]
+        if self.face_data is None:
+            return self._indices[face_from * 3:face_to * 3]
+
+        # lazy mesh, decode only the face range of the requested LOD
+        res = array.array('I')
+        res.frombytes(self.face_data[face_from * 12:face_to * 12])
+        return res
+
     def append_vertex(self, vrx):
         self.min_x = min(self.min_x, vrx.p_x)
         self.min_y = min(self.min_y, vrx.p_y)
@@ -68,20 +188,70 @@ class Mesh:
         self.max_x = max(self.max_x, vrx.p_x)
         self.max_y = max(self.max_y, vrx.p_y)
         self.max_z = max(self.max_z, vrx.p_z)
-        self.vertices.append(vrx)
+        self.positions.extend((vrx.p_x, vrx.p_y, vrx.p_z))
+        self.normals.extend((vrx.n_x, vrx.n_y, vrx.n_z))
+        self.uvs.extend((vrx.u, vrx.v, vrx.w))
+        self.colors.extend((vrx.r, vrx.g, vrx.b, vrx.a))
+
+    def append_vertex_arrays(self, positions: array.array, normals: array.array, uvs: array.array,
+                             colors: array.array):
+        # bulk version of append_vertex
+        if len(positions) == 0:
+            return
+        xs = positions[0::3]
+        ys = positions[1::3]
+        zs = positions[2::3]
+        self.min_x = min(self.min_x, min(xs))
+        self.min_y = min(self.min_y, min(ys))
+        self.min_z = min(self.min_z, min(zs))
+        self.max_x = max(self.max_x, max(xs))
+        self.max_y = max(self.max_y, max(ys))
+        self.max_z = max(self.max_z, max(zs))
+        self.positions.extend(positions)
+        self.normals.extend(normals)
+        self.uvs.extend(uvs)
+        self.colors.extend(colors)
 
     def append_triangle(self, idx):
-        self.triangles.append(idx)
+        self.indices.extend((idx.i0, idx.i1, idx.i2))
 
     def assign_lod_data(self, lod_data):
         if len(lod_data) == 2 and lod_data[0] == 0 and lod_data[1] == 0:
-            self.lod_data = [0, len(self.triangles)]
+            self.lod_data = [0, self.get_number_of_triangles()]
         else:
             self.lod_data = lod_data
 
     def get_number_of_lods(self):
         return len(self.lod_data)-1
 
+    def copy(self):
+        # cheap copy for cached meshes: typed arrays are copied with a single memcpy,
+        # the raw face block of a lazy mesh is immutable and shared
+        res = Mesh()
+        res.positions = self.positions[:]
+        res.normals = self.normals[:]
+        res.uvs = self.uvs[:]
+        res.colors = self.colors[:]
+        res._indices = self._indices[:]
+        res.face_data = self.face_data
+        res.lod_data = list(self.lod_data)
+        res.min_x = self.min_x
+        res.min_y = self.min_y
+        res.min_z = self.min_z
+        res.max_x = self.max_x
+        res.max_y = self.max_y
+        res.max_z = self.max_z
+        return res
+
+
+def _gather(typecode: str, records, stride: int, first: int, count: int) -> array.array:
+    # gathers 'count' consecutive fields starting from 'first' out of every 'stride' sized record
+    number_of_records = len(records) // stride
+    res = array.array(typecode, bytes(array.array(typecode).itemsize * number_of_records * count))
+    for i in range(count):
+        res[i::count] = array.array(typecode, records[first + i::stride])
+    return res
+
 
 #
 # https://developer.roblox.com/articles/Roblox-Mesh-Format
@@ -211,8 +381,132 @@ class Mesh:
 #
 
 
+def _read_vertex_block(mesh: Mesh, vertex_data: memoryview, sizeof_mesh_vertex: int):
+    num_vertices = len(vertex_data) // sizeof_mesh_vertex
+    vertex_floats = vertex_data.cast('f')
+    floats_per_vertex = sizeof_mesh_vertex // 4
+    positions = _gather('d', vertex_floats, floats_per_vertex, 0, 3)
+    normals = _gather('d', vertex_floats, floats_per_vertex, 3, 3)
+    uvs = _gather('d', vertex_floats, floats_per_vertex, 6, 3)
+    if sizeof_mesh_vertex == 40:
+        colors = _gather('B', vertex_data, sizeof_mesh_vertex, 36, 4)
+    else:
+        colors = array.array('B', b'\xff') * (num_vertices * 4)
+    mesh.append_vertex_arrays(positions, normals, uvs, colors)
+
+
+#
+# version 6.00 / 7.00 (chunked)
+#
+# After the 'version X.00\n' line the file is a sequence of chunks:
+#
+# struct ChunkHeader
+# {
+#   char type[8]; // chunk type padded with zeros (COREMESH, LODS, SKINNING, FACS, HSRAVIS)
+#   uint version; // chunk version
+#   uint size; // size of the chunk data that follows this header
+# }
+#
+# COREMESH v1 (uncompressed)
+#   uint numVerts; MeshVertex verts[numVerts] (40 bytes each); uint numFaces; MeshFace faces[numFaces]
+#
+# COREMESH v2 (version 7.00+) stores the same data compressed with Google Draco
+#
+# LODS v1
+#   ushort lodType; byte numHighQualityLODs; uint numLodOffsets; uint lodOffsets[numLodOffsets]
+#
+# SKINNING, FACS and HSRAVIS chunks are not used by the exporter
+#
+# Unsupported (Draco) and broken chunked meshes are not fatal: parse_mesh() returns None, the part is exported
+# as a locator and reported in the failed assets of the export
+#
+
+def index_mesh_chunks(content: bytes, offset: int) -> dict or None:
+    # one pass over the chunk headers, returns chunk type -> (chunk version, zero-copy view of the chunk data)
+    data_view = memoryview(content)
+    data_size = len(content)
+    chunks = dict()
+    while offset < data_size:
+        if offset + 16 > data_size:
+            logger.warn("Truncated mesh chunk header")
+            return None
+        chunk_type = bytes(data_view[offset:offset + 8]).rstrip(b'\x00')
+        chunk_version, chunk_size = struct.unpack_from('<II', content, offset + 8)
+        offset += 16
+        if offset + chunk_size > data_size:
+            logger.warn("Truncated mesh chunk: " + str(chunk_type))
+            return None
+        chunks[chunk_type] = (chunk_version, data_view[offset:offset + chunk_size])
+        offset += chunk_size
+    return chunks
+
+
+def _parse_chunked_mesh(content: bytes, offset: int, lazy: bool) -> Mesh or None:
+    chunks = index_mesh_chunks(content, offset)
+    if chunks is None:
+        return None
+
+    core_mesh = chunks.get(b'COREMESH', None)
+    if core_mesh is None:
+        logger.warn("Mesh has no COREMESH chunk")
+        return None
+
+    chunk_version, chunk_data = core_mesh
+    if chunk_version != 1:
+        # v2 is Draco compressed
+        logger.warn("Unsupported COREMESH chunk version: " + str(chunk_version) +
+                    (" (Draco compressed)" if chunk_version == 2 else ""))
+        return None
+
+    sizeof_mesh_vertex = 40
+    sizeof_mesh_face = 12
+    chunk_size = len(chunk_data)
+    if chunk_size < 4:
+        logger.warn("Broken COREMESH chunk")
+        return None
+
+    num_vertices = struct.unpack_from('<I', chunk_data, 0)[0]
+    vertices_end = 4 + num_vertices * sizeof_mesh_vertex
+    if chunk_size < vertices_end + 4:
+        logger.warn("Broken COREMESH chunk")
+        return None
+
+    num_faces = struct.unpack_from('<I', chunk_data, vertices_end)[0]
+    faces_end = vertices_end + 4 + num_faces * sizeof_mesh_face
+    if chunk_size < faces_end:
+        logger.warn("Broken COREMESH chunk")
+        return None
+
+    if num_vertices == 0 or num_faces == 0:
+        logger.warn("Empty mesh")
+        return None
+
+    mesh = Mesh()
+    _read_vertex_block(mesh, chunk_data[4:vertices_end], sizeof_mesh_vertex)
+    if lazy:
+        mesh.face_data = chunk_data[vertices_end + 4:faces_end]
+    else:
+        mesh.indices.frombytes(chunk_data[vertices_end + 4:faces_end])
+
+    lods = [0, num_faces]
+    lods_chunk = chunks.get(b'LODS', None)
+    if lods_chunk is not None:
+        chunk_version, chunk_data = lods_chunk
+        if chunk_version == 1 and len(chunk_data) >= 7:
+            num_lods = struct.unpack_from('<I', chunk_data, 3)[0]
+            if num_lods > 0 and len(chunk_data) >= 7 + num_lods * 4:
+                lods = list(struct.unpack_from('<' + str(num_lods) + 'I', chunk_data, 7))
+        else:
+            logger.warn("Unsupported LODS chunk version: " + str(chunk_version))
+
+    mesh.assign_lod_data(lods)
+    return mesh
+
+
 # noinspection PyUnusedLocal
-def parse_mesh(content: bytes) -> Mesh or None:
+def parse_mesh(content: bytes, lazy: bool = False) -> Mesh or None:
+    # lazy: keep a view of the face block and build triangles only for the LODs that are actually requested
+    #       (see Mesh.get_lod_indices), the mesh keeps a reference to 'content' in this case
     data_stream = io.BytesIO(content)
     header = data_stream.read(12)
 
@@ -291,10 +585,11 @@ def parse_mesh(content: bytes) -> Mesh or None:
 
     # chunked format
     if header == b'version 6.00':
-        mesh_version = 5
+        mesh_version = 6
 
+    # chunked format, COREMESH can be compressed
     if header == b'version 7.00':
-        mesh_version = 5
+        mesh_version = 7
 
     if mesh_version == 0:
         logger.fatal("Unsupported mesh header: " + str(header))
@@ -303,6 +598,9 @@ def parse_mesh(content: bytes) -> Mesh or None:
     # skip '\n'
     data_stream.read(1)
 
+    if mesh_version == 6 or mesh_version == 7:
+        return _parse_chunked_mesh(content, data_stream.tell(), lazy)
+
     sizeof_mesh_header = struct.unpack('H', data_stream.read(2))[0]
 
     sizeof_mesh_vertex = 0
@@ -312,10 +610,6 @@ def parse_mesh(content: bytes) -> Mesh or None:
     sizeof_mesh_lod = 0
     num_lods = 0
     num_joints = 0
-    num_joint_name_chars = 0
-    num_skinning_subsets = 0
-    control_to_joint_driver_version = 0
-    control_to_joint_driver_size = 0
 
     if mesh_version == 2:
         sizeof_mesh_vertex = struct.unpack('B', data_stream.read(1))[0]
@@ -337,64 +631,27 @@ def parse_mesh(content: bytes) -> Mesh or None:
             logger.fatal("Unsupported mesh v3 header size: " + str(sizeof_mesh_header))
             return None
 
-    elif mesh_version == 4:
-        # 0 - None, 1 - Unknown, 2 - RBX Simplifier, 3 - MeshOpt
-        # noinspection PyUnusedLocal
-        lod_type = struct.unpack('H', data_stream.read(2))[0]
-        num_vertices = struct.unpack('I', data_stream.read(4))[0]
-        num_faces = struct.unpack('I', data_stream.read(4))[0]
-        num_lods = struct.unpack('H', data_stream.read(2))[0]
+    elif mesh_version == 4 or mesh_version == 5:
+        # struct MeshHeader (after sizeof_MeshHeader)
+        # {
+        #   ushort lodType; // 0 - None, 1 - Unknown, 2 - RBX Simplifier, 3 - MeshOpt
+        #   uint numVerts; uint numFaces; ushort numLODs; ushort numBones;
+        #   uint sizeof_boneNamesBuffer; ushort numSubsets; byte numHighQualityLODs; byte padding;
+        #   uint facsDataFormat; uint sizeof_facsData; // v5 only
+        # }
+        # only the counts needed to locate the vertex, face and LOD blocks are used
+        _, num_vertices, num_faces, num_lods, num_joints, _, _, _, _ = struct.unpack('<HIIHHIHBB',
+                                                                                     data_stream.read(22))
+        if mesh_version == 5:
+            data_stream.read(8)
         sizeof_mesh_lod = 4
-        num_joints = struct.unpack('H', data_stream.read(2))[0]
-        num_joint_name_chars = struct.unpack('I', data_stream.read(4))[0]
-        num_skinning_subsets = struct.unpack('H', data_stream.read(2))[0]
-        # noinspection PyUnusedLocal
-        num_quality_lods = struct.unpack('B', data_stream.read(1))[0]
-        # skip padding
-        data_stream.read(1)
 
         sizeof_mesh_vertex = 40
         sizeof_mesh_face = 12
-        if sizeof_mesh_header != 24:
-            logger.fatal("Unsupported mesh v4 header size: " + str(sizeof_mesh_header))
+        expected_header_size = 24 if mesh_version == 4 else 32
+        if sizeof_mesh_header != expected_header_size:
+            logger.fatal("Unsupported mesh v" + str(mesh_version) + " header size: " + str(sizeof_mesh_header))
             return None
-    elif mesh_version == 5:
-        # 0 - None, 1 - Unknown, 2 - RBX Simplifier, 3 - MeshOpt
-        # noinspection PyUnusedLocal
-        lod_type = struct.unpack('H', data_stream.read(2))[0]
-        num_vertices = struct.unpack('I', data_stream.read(4))[0]
-        num_faces = struct.unpack('I', data_stream.read(4))[0]
-        num_lods = struct.unpack('H', data_stream.read(2))[0]
-        sizeof_mesh_lod = 4
-        num_joints = struct.unpack('H', data_stream.read(2))[0]
-        num_joint_name_chars = struct.unpack('I', data_stream.read(4))[0]
-        num_skinning_subsets = struct.unpack('H', data_stream.read(2))[0]
-        # noinspection PyUnusedLocal
-        num_quality_lods = struct.unpack('B', data_stream.read(1))[0]
-        # skip padding
-        data_stream.read(1)
-
-        control_to_joint_driver_version = struct.unpack('I', data_stream.read(4))[0]
-        control_to_joint_driver_size = struct.unpack('I', data_stream.read(4))[0]
-
-        sizeof_mesh_vertex = 40
-        sizeof_mesh_face = 12
-        if sizeof_mesh_header != 32:
-            logger.fatal("Unsupported mesh v5 header size: " + str(sizeof_mesh_header))
-            return None
-    elif mesh_version == 6 or  mesh_version == 7:
-        chunk_name = bytearray(8)
-        data_stream.readinto(chunk_name)
-        chunk_version = struct.unpack('I', data_stream.read(4))[0]
-        chunk_size = struct.unpack('I', data_stream.read(4))[0]
-        # chunk types
-        # COREMESH v1(normal) / v2 (compressed)
-        # LODS
-        # SKINNING
-        # FACS
-        # HSRAVIS
-        logger.fatal("Still WiP")
-        return None
     else:
         logger.fatal("Unsupported mesh header: " + str(header))
 
@@ -419,156 +676,191 @@ def parse_mesh(content: bytes) -> Mesh or None:
             logger.fatal("Unsupported LOD header size: " + str(sizeof_mesh_lod))
             return None
 
-    # read vertices
-    for i in range(0, num_vertices):
-        pos_x = struct.unpack('f', data_stream.read(4))[0]
-        pos_y = struct.unpack('f', data_stream.read(4))[0]
-        pos_z = struct.unpack('f', data_stream.read(4))[0]
-        nrm_x = struct.unpack('f', data_stream.read(4))[0]
-        nrm_y = struct.unpack('f', data_stream.read(4))[0]
-        nrm_z = struct.unpack('f', data_stream.read(4))[0]
-        t_u = struct.unpack('f', data_stream.read(4))[0]
-        t_v = struct.unpack('f', data_stream.read(4))[0]
-        t_w = struct.unpack('f', data_stream.read(4))[0]
-        if sizeof_mesh_vertex == 40:
-            col_r = struct.unpack('B', data_stream.read(1))[0]
-            col_g = struct.unpack('B', data_stream.read(1))[0]
-            col_b = struct.unpack('B', data_stream.read(1))[0]
-            col_a = struct.unpack('B', data_stream.read(1))[0]
-        else:
-            col_r = 0xff
-            col_g = 0xff
-            col_b = 0xff
-            col_a = 0xff
-        vrx = Vertex(pos_x, pos_y, pos_z, nrm_x, nrm_y, nrm_z, t_u, t_v, t_w, col_r, col_g, col_b, col_a)
-        mesh.append_vertex(vrx)
-
-    # read skinning data if need
+    # decode the rest of the file in bulk, straight from the source buffer
+    data_view = memoryview(content)
+    offset = data_stream.tell()
+
+    vertices_end = offset + num_vertices * sizeof_mesh_vertex
+    skinning_end = vertices_end
     if num_joints > 0:
-        for i in range(0, num_vertices):
-            joint0 = struct.unpack('B', data_stream.read(1))[0]
-            joint1 = struct.unpack('B', data_stream.read(1))[0]
-            joint2 = struct.unpack('B', data_stream.read(1))[0]
-            joint3 = struct.unpack('B', data_stream.read(1))[0]
-            weight0 = struct.unpack('B', data_stream.read(1))[0]
-            weight1 = struct.unpack('B', data_stream.read(1))[0]
-            weight2 = struct.unpack('B', data_stream.read(1))[0]
-            weight3 = struct.unpack('B', data_stream.read(1))[0]
+        # 4 joint indices + 4 joint weights (bytes) per vertex, the exporter doesn't use skinning data
+        skinning_end += num_vertices * 8
+    faces_end = skinning_end + num_faces * sizeof_mesh_face
+    lods_end = faces_end + num_lods * sizeof_mesh_lod
+
+    if len(content) < lods_end:
+        logger.fatal("Unexpected end of mesh data")
+        return None
+
+    # read vertices
+    _read_vertex_block(mesh, data_view[offset:vertices_end], sizeof_mesh_vertex)
 
     # read triangles (indices)
-    for i in range(0, num_faces):
-        index0 = struct.unpack('I', data_stream.read(4))[0]
-        index1 = struct.unpack('I', data_stream.read(4))[0]
-        index2 = struct.unpack('I', data_stream.read(4))[0]
-        tri = Triangle(index0, index1, index2)
-        mesh.append_triangle(tri)
+    if lazy:
+        mesh.face_data = data_view[skinning_end:faces_end]
+    else:
+        mesh.indices.frombytes(data_view[skinning_end:faces_end])
 
     lods = []
     if num_lods > 0:
-        for i in range(0, num_lods):
-            lod_offset = struct.unpack('I', data_stream.read(4))[0]
-            # logger.message(str(i) + " -> " + str(lod_offset))
-            lods.append(lod_offset)
+        lods.extend(struct.unpack_from('<' + str(num_lods) + 'I', content, faces_end))
     else:
         lods.append(0)
         lods.append(num_faces)
 
-    for i in range(0, num_joints):
-        name_offset = struct.unpack('I', data_stream.read(4))[0]
-        parent_index = struct.unpack('H', data_stream.read(2))[0]
-        lod_index = struct.unpack('H', data_stream.read(2))[0]
-        max_skin_radius = struct.unpack('f', data_stream.read(4))[0]
-        r00 = struct.unpack('f', data_stream.read(4))[0]
-        r01 = struct.unpack('f', data_stream.read(4))[0]
-        r02 = struct.unpack('f', data_stream.read(4))[0]
-        r10 = struct.unpack('f', data_stream.read(4))[0]
-        r11 = struct.unpack('f', data_stream.read(4))[0]
-        r12 = struct.unpack('f', data_stream.read(4))[0]
-        r20 = struct.unpack('f', data_stream.read(4))[0]
-        r21 = struct.unpack('f', data_stream.read(4))[0]
-        r22 = struct.unpack('f', data_stream.read(4))[0]
-        tx = struct.unpack('f', data_stream.read(4))[0]
-        ty = struct.unpack('f', data_stream.read(4))[0]
-        tz = struct.unpack('f', data_stream.read(4))[0]
-
-    # ascii name table
-    joint_name_table = bytearray(num_joint_name_chars)
-    data_stream.readinto(joint_name_table)
-
-    for i in range(0, num_skinning_subsets):
-        subset_start_face = struct.unpack('I', data_stream.read(4))[0]
-        subset_num_faces = struct.unpack('I', data_stream.read(4))[0]
-        subset_start_vertex = struct.unpack('I', data_stream.read(4))[0]
-        subset_num_vertices = struct.unpack('I', data_stream.read(4))[0]
-        subset_num_joints = struct.unpack('I', data_stream.read(4))[0]
-        subset_joint_to_mesh_joint = []
-        for j in range(0, 26):
-            joint_mapping = struct.unpack('H', data_stream.read(2))[0]
-            subset_joint_to_mesh_joint.append(joint_mapping)
+    # joints, joint names, skinning subsets and FACS data follow the LOD table,
+    # none of them are used by the exporter so there is no need to decode them
 
     mesh.assign_lod_data(lods)
 
-    # read FACS. data
-    if control_to_joint_driver_version != 0 and control_to_joint_driver_size != 0:
-        # read facs driver data
-        data_stream.read(control_to_joint_driver_size)
-
     return mesh
 
 
+def _transform_xyz_python(data: array.array, m: tuple, translate: bool, normalize: bool):
+    xs = data[0::3]
+    ys = data[1::3]
+    zs = data[2::3]
+    m00, m01, m02, m03, m10, m11, m12, m13, m20, m21, m22, m23 = m
+    if not translate:
+        m03 = m13 = m23 = 0.0
+    rx = [m00 * x + m01 * y + m02 * z + m03 for x, y, z in zip(xs, ys, zs)]
+    ry = [m10 * x + m11 * y + m12 * z + m13 for x, y, z in zip(xs, ys, zs)]
+    rz = [m20 * x + m21 * y + m22 * z + m23 for x, y, z in zip(xs, ys, zs)]
+    if normalize:
+        scales = [1.0 / math.sqrt(x * x + y * y + z * z) if x or y or z else 0.0 for x, y, z in zip(rx, ry, rz)]
+        rx = [x * k for x, k in zip(rx, scales)]
+        ry = [y * k for y, k in zip(ry, scales)]
+        rz = [z * k for z, k in zip(rz, scales)]
+    data[0::3] = array.array('d', rx)
+    data[1::3] = array.array('d', ry)
+    data[2::3] = array.array('d', rz)
+
+
+def _transform_xyz_numpy(data: array.array, m: tuple, translate: bool, normalize: bool):
+    # view of the array.array memory, transformed in place
+    xyz = numpy.frombuffer(data, dtype=numpy.float64).reshape(-1, 3)
+    matrix = numpy.array(m, dtype=numpy.float64).reshape(3, 4)
+    res = xyz @ matrix[:, :3].T
+    if translate:
+        res += matrix[:, 3]
+    if normalize:
+        lengths = numpy.sqrt(numpy.einsum('ij,ij->i', res, res))
+        lengths[lengths == 0.0] = 1.0
+        res /= lengths[:, None]
+    xyz[:] = res
+    del xyz
+
+
+def transform_mesh(mesh: Mesh, matrix: tuple, normal_matrix: tuple, normalize_normals: bool):
+    # batched vertex transform
+    # matrix - row major 3x4 matrix applied to positions (rotation/scale + translation)
+    # normal_matrix - row major 3x4 matrix applied to normals (translation part is ignored),
+    #                 normals are renormalized if 'normalize_normals' is set
+    if mesh.get_number_of_vertices() == 0:
+        return
+    transform_xyz = _transform_xyz_numpy if numpy is not None else _transform_xyz_python
+    transform_xyz(mesh.positions, matrix, True, False)
+    transform_xyz(mesh.normals, normal_matrix, False, normalize_normals)
+
+
+def get_mesh_memory_size(mesh: Mesh) -> int:
+    # approximate number of bytes kept alive by the mesh
+    size = 0
+    for data in (mesh.positions, mesh.normals, mesh.uvs, mesh.colors, mesh._indices):
+        size += len(data) * data.itemsize
+    if mesh.face_data is not None:
+        # a lazy mesh keeps the whole source payload alive
+        face_data = mesh.face_data
+        size += len(face_data.obj) if isinstance(face_data, memoryview) else len(face_data)
+    return size
+
+
+class MeshCache:
+    # thread-safe LRU cache of parsed meshes keyed by payload hash (SHA-256), evicts least recently used
+    # meshes when their total size exceeds 'max_size' bytes
+    # callers always get their own copy of the cached mesh, so they are free to modify it
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, payload_hash: str, content: bytes, lazy: bool = False) -> Mesh or None:
+        with self.lock:
+            entry = self.entries.get(payload_hash, None)
+            if entry is not None:
+                self.entries.move_to_end(payload_hash)
+                self.hits += 1
+                metrics.count('mesh_cache_hits')
+                return entry[0].copy()
+            self.misses += 1
+            metrics.count('mesh_cache_misses')
+
+        mesh = parse_mesh(content, lazy)
+        if mesh is None:
+            return None
+
+        size = get_mesh_memory_size(mesh)
+        with self.lock:
+            if payload_hash not in self.entries and size <= self.max_size:
+                self.entries[payload_hash] = (mesh, size)
+                self.total_size += size
+                while self.total_size > self.max_size:
+                    _, (_, evicted_size) = self.entries.popitem(last=False)
+                    self.total_size -= evicted_size
+
+        return mesh.copy()
+
+    def __contains__(self, payload_hash: str) -> bool:
+        with self.lock:
+            return payload_hash in self.entries
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_size = 0
+
+
 def convert_mesh_to_fbx_geometry(mesh: Mesh, lod: int = 0) -> fbx.FbxGeometry:
     # number_of_lods = mesh.get_number_of_lods()
     geo = fbx.FbxGeometry()
 
-    face_from = mesh.lod_data[lod + 0]
-    face_to = mesh.lod_data[lod + 1]
-
-    min_index = 999999999
-    max_index = -1
-    for tri in range(face_from, face_to):
-        t = mesh.triangles[tri]
-        i0 = t.i0
-        i1 = t.i1
-        i2 = t.i2
-        geo.indices.append(i0)
-        geo.indices.append(i1)
-        geo.indices.append(i2)
-        if i0 < min_index:
-            min_index = i0
-        if i1 < min_index:
-            min_index = i1
-        if i2 < min_index:
-            min_index = i2
-        if i0 > max_index:
-            max_index = i0
-        if i1 > max_index:
-            max_index = i1
-        if i2 > max_index:
-            max_index = i2
-
-    number_of_vertices = max_index - min_index
-    geo.vertices = [fbx.FbxVertex] * (number_of_vertices + 1)
-
-    for i in range(len(geo.indices)):
-        index = geo.indices[i]
-        vertex = mesh.vertices[index]
-        index = index - min_index
-
-        fbx_vertex = fbx.FbxVertex()
-        fbx_vertex.x = vertex.p_x
-        fbx_vertex.y = vertex.p_y
-        fbx_vertex.z = vertex.p_z
-
-        fbx_vertex.nx = vertex.n_x
-        fbx_vertex.ny = vertex.n_y
-        fbx_vertex.nz = vertex.n_z
-
-        fbx_vertex.u = vertex.u
-        fbx_vertex.v = -vertex.v + 1.0
-
-        # noinspection PyTypeChecker
-        geo.vertices[index] = fbx_vertex
-        geo.indices[i] = index
+    indices = mesh.get_lod_indices(lod)
+    if len(indices) == 0:
+        return geo
+
+    # vertices referenced by the LOD, in the original order
+    # (other LODs and unused vertices are not exported)
+    referenced = sorted(set(indices))
+    first_index = referenced[0]
+    last_index = referenced[-1]
+
+    positions = mesh.positions
+    normals = mesh.normals
+    uvs = mesh.uvs
+    if last_index - first_index + 1 == len(referenced):
+        # contiguous vertex range (common case), arrays are just slices
+        geo.positions = positions[first_index * 3:(last_index + 1) * 3]
+        geo.normals = normals[first_index * 3:(last_index + 1) * 3]
+        u = uvs[first_index * 3:(last_index + 1) * 3:3]
+        v = uvs[first_index * 3 + 1:(last_index + 1) * 3:3]
+        geo.indices = array.array('i', [index - first_index for index in indices])
+    else:
+        geo.positions = fbx.gather_xyz(positions, referenced)
+        geo.normals = fbx.gather_xyz(normals, referenced)
+        all_u = uvs[0::3]
+        all_v = uvs[1::3]
+        u = [all_u[index] for index in referenced]
+        v = [all_v[index] for index in referenced]
+        remap = dict(zip(referenced, range(len(referenced))))
+        geo.indices = array.array('i', map(remap.__getitem__, indices))
+
+    # FBX v axis goes up
+    geo.uvs = array.array('d', bytes(len(referenced) * 2 * 8))
+    geo.uvs[0::2] = array.array('d', u)
+    geo.uvs[1::2] = array.array('d', [-value + 1.0 for value in v])
 
     return geo
 
@@ -576,18 +868,22 @@ def convert_mesh_to_fbx_geometry(mesh: Mesh, lod: int = 0) -> fbx.FbxGeometry:
 def save_to_obj(file_name: str, mesh: Mesh):
     file_handle = open(file_name, 'w+')
 
-    for v in mesh.vertices:
-        line = 'v ' + str(v.p_x) + ' ' + str(v.p_y) + ' ' + str(v.p_z) + '\n'
+    positions = mesh.positions
+    for i in range(0, len(positions), 3):
+        line = 'v ' + str(positions[i + 0]) + ' ' + str(positions[i + 1]) + ' ' + str(positions[i + 2]) + '\n'
         file_handle.write(line)
 
-    for v in mesh.vertices:
-        line = 'vt ' + str(v.u) + ' ' + str(v.v) + '\n'
+    uvs = mesh.uvs
+    for i in range(0, len(uvs), 3):
+        line = 'vt ' + str(uvs[i + 0]) + ' ' + str(uvs[i + 1]) + '\n'
         file_handle.write(line)
 
-    for v in mesh.vertices:
-        line = 'vn ' + str(v.n_x) + ' ' + str(v.n_y) + ' ' + str(v.n_z) + '\n'
+    normals = mesh.normals
+    for i in range(0, len(normals), 3):
+        line = 'vn ' + str(normals[i + 0]) + ' ' + str(normals[i + 1]) + ' ' + str(normals[i + 2]) + '\n'
         file_handle.write(line)
 
+    indices = mesh.indices
     number_of_lods = mesh.get_number_of_lods()
     for lod in range(0, number_of_lods):
 
@@ -598,10 +894,9 @@ def save_to_obj(file_name: str, mesh: Mesh):
         face_to = mesh.lod_data[lod + 1]
 
         for tri in range(face_from, face_to):
-            t = mesh.triangles[tri]
-            i0 = str(t.i0 + 1)
-            i1 = str(t.i1 + 1)
-            i2 = str(t.i2 + 1)
+            i0 = str(indices[tri * 3 + 0] + 1)
+            i1 = str(indices[tri * 3 + 1] + 1)
+            i2 = str(indices[tri * 3 + 2] + 1)
             line = 'f ' + \
                    i0 + '/' + i0 + '/' + i0 + ' ' + \
                    i1 + '/' + i1 + '/' + i1 + ' ' + \
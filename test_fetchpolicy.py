@@ -0,0 +1,219 @@
+# The MIT License (MIT)
+#
+# 	Copyright (c) 2019 Sergey Makeev
+#
+# 	Permission is hereby granted, free of charge, to any person obtaining a copy
+# 	of this software and associated documentation files (the "Software"), to deal
+# 	in the Software without restriction, including without limitation the rights
+# 	to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# 	copies of the Software, and to permit persons to whom the Software is
+# 	furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in
+# 	all copies or substantial portions of the Software.
+#
+# 	THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# 	IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# 	FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# 	AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# 	LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# 	OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# 	THE SOFTWARE.
+import io
+import threading
+import unittest
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logger
+import httpclient
+import fetchpolicy
+
+#
+# FetchPolicy tests against a local stub asset server
+#
+# usage: python -m unittest test_fetchpolicy
+#
+# Time never passes for real: the policy gets a fake clock, and sleep() only moves that clock forward
+#
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = list()
+
+    def clock(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class MaxJitter:
+    # full jitter always picks the upper bound, backoff delays become deterministic
+    @staticmethod
+    def uniform(low: float, high: float) -> float:
+        return high
+
+
+class StubServer:
+    # serves scripted responses: path -> list of (status, headers), the last response is repeated
+    def __init__(self):
+        self.responses = dict()
+        self.requests = list()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            # noinspection PyPep8Naming
+            def do_GET(self):
+                stub.requests.append(self.path)
+                script = stub.responses.get(self.path, [(404, {})])
+                status, headers = script.pop(0) if len(script) > 1 else script[0]
+                body = b'payload' if status == 200 else b''
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = 'http://127.0.0.1:{0}'.format(self.httpd.server_address[1])
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FetchPolicyTest(unittest.TestCase):
+    def setUp(self):
+        # retries are logged as warnings
+        logger.configure(logger.ERROR, stream=io.StringIO())
+        self.server = StubServer()
+        self.pool = httpclient.ConnectionPool()
+        self.fake = FakeClock()
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.close()
+        logger.configure()
+
+    def create_policy(self, **kwargs) -> fetchpolicy.FetchPolicy:
+        return fetchpolicy.FetchPolicy(clock=self.fake.clock, sleep=self.fake.sleep, rng=MaxJitter(), **kwargs)
+
+    def fetch(self, policy: fetchpolicy.FetchPolicy, path: str) -> httpclient.HttpResponse:
+        url = self.server.url + path
+        return policy.call(url, lambda: self.pool.get(url))
+
+    def test_transient_errors_are_retried_with_exponential_backoff(self):
+        self.server.responses['/a'] = [(503, {}), (500, {}), (429, {}), (200, {})]
+        policy = self.create_policy(max_retries=4, backoff_base=0.5, backoff_max=30.0)
+        response = self.fetch(policy, '/a')
+        self.assertEqual(response.body, b'payload')
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(self.fake.sleeps, [0.5, 1.0, 2.0])
+
+    def test_backoff_is_capped(self):
+        self.server.responses['/a'] = [(503, {})] * 5 + [(200, {})]
+        policy = self.create_policy(max_retries=5, backoff_base=1.0, backoff_max=3.0)
+        self.fetch(policy, '/a')
+        self.assertEqual(self.fake.sleeps, [1.0, 2.0, 3.0, 3.0, 3.0])
+
+    def test_last_error_is_raised_when_retries_are_exhausted(self):
+        self.server.responses['/a'] = [(503, {})]
+        policy = self.create_policy(max_retries=2)
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.fetch(policy, '/a')
+        self.assertEqual(context.exception.getcode(), 503)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.fake.sleeps), 2)
+
+    def test_retry_after_is_honored(self):
+        self.server.responses['/a'] = [(429, {'Retry-After': '7'}), (503, {'Retry-After': '120'}), (200, {})]
+        policy = self.create_policy(max_retries=4, backoff_base=0.5, backoff_max=30.0)
+        self.fetch(policy, '/a')
+        # Retry-After is used instead of the backoff, but not longer than backoff_max
+        self.assertEqual(self.fake.sleeps, [7.0, 30.0])
+
+    def test_unknown_errors_are_not_retried(self):
+        self.server.responses['/a'] = [(418, {}), (200, {})]
+        policy = self.create_policy()
+        with self.assertRaises(urllib.error.HTTPError):
+            self.fetch(policy, '/a')
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.fake.sleeps, [])
+
+    def test_connection_errors_are_retried(self):
+        policy = self.create_policy(max_retries=2, backoff_base=0.5)
+        # nothing listens on the port of a closed server
+        closed_server = StubServer()
+        closed_server.close()
+        url = closed_server.url + '/a'
+        with self.assertRaises(urllib.error.URLError):
+            policy.call(url, lambda: self.pool.get(url))
+        self.assertEqual(self.fake.sleeps, [0.5, 1.0])
+
+    def test_permanent_errors_are_negatively_cached(self):
+        self.server.responses['/missing'] = [(404, {}), (200, {})]
+        policy = self.create_policy(negative_ttl=60.0)
+        with self.assertRaises(urllib.error.HTTPError):
+            self.fetch(policy, '/missing')
+
+        # known bad asset, no request is made
+        self.fake.now += 59.0
+        with self.assertRaises(urllib.error.URLError) as context:
+            self.fetch(policy, '/missing')
+        self.assertNotIsInstance(context.exception, urllib.error.HTTPError)
+        self.assertEqual(len(self.server.requests), 1)
+
+        # expired, requested again
+        self.fake.now += 1.0
+        self.assertEqual(self.fetch(policy, '/missing').body, b'payload')
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.fake.sleeps, [])
+
+    def test_negative_cache_can_be_disabled(self):
+        self.server.responses['/missing'] = [(404, {}), (200, {})]
+        policy = self.create_policy(negative_ttl=0.0)
+        with self.assertRaises(urllib.error.HTTPError):
+            self.fetch(policy, '/missing')
+        self.assertEqual(self.fetch(policy, '/missing').body, b'payload')
+
+    def test_requests_are_rate_limited(self):
+        self.server.responses['/a'] = [(200, {})]
+        policy = self.create_policy(max_requests_per_second=2.0)
+        for _ in range(6):
+            self.fetch(policy, '/a')
+        # burst of 2 requests, then one request every 0.5 seconds
+        self.assertEqual(len(self.server.requests), 6)
+        self.assertEqual(self.fake.sleeps, [0.5, 0.5, 0.5, 0.5])
+
+    def test_rate_limiter_refills_over_time(self):
+        limiter = fetchpolicy.RateLimiter(4.0, 2, self.fake.clock, self.fake.sleep)
+        limiter.acquire()
+        limiter.acquire()
+        self.fake.now += 0.5
+        # 2 tokens are back
+        limiter.acquire()
+        limiter.acquire()
+        self.assertEqual(self.fake.sleeps, [])
+        limiter.acquire()
+        self.assertEqual(self.fake.sleeps, [0.25])
+
+    def test_unlimited_rate(self):
+        limiter = fetchpolicy.RateLimiter(0.0, 1, self.fake.clock, self.fake.sleep)
+        for _ in range(100):
+            limiter.acquire()
+        self.assertEqual(self.fake.sleeps, [])
+
+
+if __name__ == '__main__':
+    unittest.main()